@@ -0,0 +1,188 @@
+#!/usr/bin/env python3
+#
+# Copyright (C) 2005 - present  Alexander Czutro <github@czutro.ch>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# For more details, see the provided licence file or
+# <http://www.gnu.org/licenses>.
+#
+################################################################### aczutro ###
+
+"""
+Measures many AsyncReactiveActor instances on one event loop: start time,
+message throughput, idle CPU time and stop time, and the round-trip rate
+between a ReactiveThread and an AsyncReactiveActor.
+
+Run from the repository root after sourcing .setenv.
+"""
+
+from czutils.lib import czthreading
+
+import argparse
+import asyncio
+import threading
+import time
+
+
+class Hop(czthreading.Message):
+    __slots__ = ("hops",)
+
+    def __init__(self, hops: int):
+        super().__init__()
+        self.hops = hops
+    #__init__
+#Hop
+
+
+class Done(czthreading.Message):
+    pass
+#Done
+
+
+class Relay(czthreading.AsyncReactiveActor):
+    """
+    Passes a Hop on to the next actor in a ring until it has no hops left.
+    """
+    def __init__(self, name: str, finished: asyncio.Event):
+        super().__init__(name)
+        self.next = None
+        self._finished = finished
+        self.addMessageProcessor(Hop, self.processHop)
+    #__init__
+
+    def processHop(self, message: Hop):
+        if message.hops:
+            message.hops -= 1
+            self.next.comm(message)
+        else:
+            self._finished.set()
+        #else
+    #processHop
+#Relay
+
+
+class Echo(czthreading.AsyncReactiveActor):
+    """
+    Replies to every Hop sent by a ReactiveThread.
+    """
+    def __init__(self, peer: czthreading.ReactiveThread):
+        super().__init__("echo")
+        self._peer = peer
+        self.addMessageProcessor(Hop, self.processHop)
+    #__init__
+
+    async def processHop(self, message: Hop):
+        await self._peer.commAsync(message)
+    #processHop
+#Echo
+
+
+class Pinger(czthreading.ReactiveThread):
+    """
+    Sends a Hop to an AsyncReactiveActor and sends it again whenever it comes
+    back, until it has no hops left.
+    """
+    def __init__(self, done: threading.Event):
+        super().__init__("pinger")
+        self.peer = None
+        self._done = done
+        self.addMessageProcessor(Hop, self.processHop)
+    #__init__
+
+    def processHop(self, message: Hop):
+        if message.hops:
+            message.hops -= 1
+            self.peer.comm(message)
+        else:
+            self._done.set()
+        #else
+    #processHop
+#Pinger
+
+
+async def measureRing(actors: int, messages: int, idleTime: float) -> dict:
+    """
+    :returns: a dictionary with the times ('start', 'stop', seconds), the
+              message rate ('rate', messages per second) and the CPU time
+              used while idling ('idleCpu', seconds).
+    """
+    finished = asyncio.Event()
+    t0 = time.perf_counter()
+    ring = [ Relay("relay-%d" % i, finished) for i in range(actors) ]
+    for i, actor in enumerate(ring):
+        actor.next = ring[(i + 1) % actors]
+        actor.start()
+    #for
+    await asyncio.sleep(0)
+    t1 = time.perf_counter()
+    ring[0].comm(Hop(messages))
+    await finished.wait()
+    t2 = time.perf_counter()
+    cpuStart = time.process_time()
+    await asyncio.sleep(idleTime)
+    idleCpu = time.process_time() - cpuStart
+    t3 = time.perf_counter()
+    for actor in ring:
+        await actor.stop()
+    #for
+    t4 = time.perf_counter()
+    return { "start": t1 - t0, "rate": messages / (t2 - t1),
+             "idleCpu": idleCpu, "stop": t4 - t3 }
+#measureRing
+
+
+async def measureBridge(roundTrips: int) -> float:
+    """
+    :returns: round trips per second between a ReactiveThread and an
+              AsyncReactiveActor.
+    """
+    done = threading.Event()
+    pinger = Pinger(done)
+    echo = Echo(pinger)
+    pinger.peer = echo
+    echo.start()
+    pinger.start()
+    start = time.perf_counter()
+    pinger.comm(Hop(roundTrips))
+    await asyncio.get_running_loop().run_in_executor(None, done.wait)
+    elapsed = time.perf_counter() - start
+    pinger.stop()
+    await echo.stop()
+    return roundTrips / elapsed
+#measureBridge
+
+
+def main():
+    P = argparse.ArgumentParser(description=__doc__.strip().split("\n\n")[0])
+    P.add_argument("--actors", type=int, default=10000,
+                   help="number of actors in the ring (default: %(default)s)")
+    P.add_argument("--messages", type=int, default=100000,
+                   help="hops of the message around the ring "
+                        "(default: %(default)s)")
+    P.add_argument("--idle", type=float, default=2.0,
+                   help="seconds to idle (default: %(default)s)")
+    P.add_argument("--round-trips", type=int, default=20000,
+                   help="round trips between a thread and an actor "
+                        "(default: %(default)s)")
+    A = P.parse_args()
+
+    ring = asyncio.run(measureRing(A.actors, A.messages, A.idle))
+    print("%d actors on one event loop" % A.actors)
+    print("  start:     %.3f s" % ring["start"])
+    print("  messages:  %.0f per second" % ring["rate"])
+    print("  idle CPU:  %.4f s in %.1f s" % (ring["idleCpu"], A.idle))
+    print("  stop:      %.3f s" % ring["stop"])
+    rate = asyncio.run(measureBridge(A.round_trips))
+    print("thread <-> actor: %.0f round trips per second" % rate)
+#main
+
+
+if __name__ == '__main__':
+    main()
+#if
+
+### aczutro ###################################################################
@@ -0,0 +1,134 @@
+#!/usr/bin/env python3
+#
+# Copyright (C) 2005 - present  Alexander Czutro <github@czutro.ch>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# For more details, see the provided licence file or
+# <http://www.gnu.org/licenses>.
+#
+################################################################### aczutro ###
+
+"""
+Compares MessageCodec with pickle on throughput and bytes per message.
+
+Run from the repository root after sourcing .setenv.
+"""
+
+from czutils.lib import czthreading
+
+import argparse
+import pickle
+import time
+
+
+@czthreading.binaryMessage(1, x = "d", y = "d", seq = "q", ok = "?")
+class Point(czthreading.Message):
+    __slots__ = ("x", "y", "seq", "ok")
+
+    def __init__(self, x: float, y: float, seq: int, ok: bool = True):
+        super().__init__()
+        self.x = x
+        self.y = y
+        self.seq = seq
+        self.ok = ok
+    #__init__
+#Point
+
+
+@czthreading.binaryMessage(2, sender = "str", seq = "I", payload = "bytes")
+class Tagged(czthreading.Message):
+    __slots__ = ("sender", "seq", "payload")
+
+    def __init__(self, sender: str, seq: int, payload: bytes):
+        super().__init__()
+        self.sender = sender
+        self.seq = seq
+        self.payload = payload
+    #__init__
+#Tagged
+
+
+def benchmark(codec: czthreading.MessageCodec,
+              messages: list[czthreading.Message],
+              rounds: int = 5) -> dict:
+    """
+    Compares a codec with pickle on a list of sample messages.
+
+    :param codec:    The codec.
+
+    :param messages: Sample messages, e.g. recorded from real traffic.
+
+    :param rounds:   Number of times each measurement is repeated; the
+                     fastest round counts.
+
+    :returns: a dictionary with one entry per method ('codec', 'pickle'),
+              each holding 'bytesPerMessage' and the rates (messages per
+              second) 'encode', 'decode' and 'roundTrip'.
+    """
+    clock = time.perf_counter
+    dumps = lambda message: pickle.dumps(message, pickle.HIGHEST_PROTOCOL)
+    methods = { "codec": (codec.encode, codec.decode),
+                "pickle": (dumps, pickle.loads) }
+    result = dict()
+    for method, (encode, decode) in methods.items():
+        encodeTime = decodeTime = float("inf")
+        for _ in range(rounds):
+            start = clock()
+            encoded = [ encode(message) for message in messages ]
+            middle = clock()
+            for data in encoded:
+                decode(data)
+            #for
+            end = clock()
+            encodeTime = min(encodeTime, middle - start)
+            decodeTime = min(decodeTime, end - middle)
+        #for
+        n = len(messages)
+        result[method] = {
+            "bytesPerMessage": sum(map(len, encoded)) / n if n else 0.0,
+            "encode": n / encodeTime if encodeTime else 0.0,
+            "decode": n / decodeTime if decodeTime else 0.0,
+            "roundTrip": n / (encodeTime + decodeTime)
+                         if encodeTime + decodeTime else 0.0,
+        }
+    #for
+    return result
+#benchmark
+
+
+def main():
+    P = argparse.ArgumentParser(description=__doc__.strip().split("\n\n")[0])
+    P.add_argument("--messages", type=int, default=20000,
+                   help="sample messages per class (default: %(default)s)")
+    P.add_argument("--rounds", type=int, default=5,
+                   help="rounds; the fastest counts (default: %(default)s)")
+    A = P.parse_args()
+
+    samples = {
+        "Point": [ Point(i * 0.5, i * 0.25, i) for i in range(A.messages) ],
+        "Tagged": [ Tagged("worker-%d" % (i % 8), i, b"x" * 16)
+                    for i in range(A.messages) ],
+    }
+    codec = czthreading.MessageCodec()
+    print("%-8s %-7s %8s %12s %12s %12s" % ("message", "method", "bytes",
+                                            "encode/s", "decode/s",
+                                            "round trip/s"))
+    for name, messages in samples.items():
+        for method, r in benchmark(codec, messages, A.rounds).items():
+            print("%-8s %-7s %8.1f %12.0f %12.0f %12.0f"
+                  % (name, method, r["bytesPerMessage"], r["encode"],
+                     r["decode"], r["roundTrip"]))
+        #for
+    #for
+#main
+
+
+if __name__ == '__main__':
+    main()
+#if
+
+### aczutro ###################################################################
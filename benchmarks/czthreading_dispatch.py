@@ -0,0 +1,153 @@
+#!/usr/bin/env python3
+#
+# Copyright (C) 2005 - present  Alexander Czutro <github@czutro.ch>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# For more details, see the provided licence file or
+# <http://www.gnu.org/licenses>.
+#
+################################################################### aczutro ###
+
+"""
+Measures the per-message dispatch overhead of ReactiveThread, compared with
+the former dispatch by class name.
+
+Run from the repository root after sourcing .setenv.  Messages are
+dispatched in the calling thread, without a mailbox, so that only the
+dispatch is measured.
+"""
+
+from czutils.lib import czthreading
+
+import argparse
+import logging
+import time
+
+
+_logger = logging.getLogger(czthreading.__name__)
+
+
+class Sample(czthreading.Message):
+    pass
+#Sample
+
+
+class DerivedSample(Sample):
+    pass
+#DerivedSample
+
+
+class Counter(czthreading.ReactiveThread):
+    """
+    A component whose message processor does nothing but count.
+    """
+    def __init__(self):
+        super().__init__("counter")
+        self.count = 0
+        self._byName = { "Sample": self.processSample,
+                         "DerivedSample": self.processSample }
+    #__init__
+
+    @czthreading.messageProcessor(Sample)
+    def processSample(self, message: Sample):
+        self.count += 1
+    #processSample
+
+    def legacyDispatch(self, message: czthreading.Message) -> bool:
+        """
+        The dispatch of one message as done before dispatch by class: by
+        class name, with eagerly formatted log messages.
+        """
+        messageType = message.msgType()
+        _logger.info("%s: received message of type %s"
+                     % (self.name(), messageType))
+        if messageType == "QuitMessage":
+            _logger.info("%s: received QuitMessage" % self.name())
+            return True
+        #if
+        try:
+            self._byName[messageType](message)
+        except KeyError:
+            _logger.warning("%s: don't know what to do with messages of type %s"
+                            % (self.name(), messageType))
+        #except
+        return False
+    #legacyDispatch
+#Counter
+
+
+def bestTime(function, rounds: int) -> float:
+    """
+    :returns: the fastest of 'rounds' calls of function, in seconds.
+    """
+    best = float("inf")
+    for _ in range(rounds):
+        start = time.perf_counter()
+        function()
+        best = min(best, time.perf_counter() - start)
+    #for
+    return best
+#bestTime
+
+
+def measure(messageClass: type, count: int, batchSize: int,
+            rounds: int) -> dict:
+    """
+    :returns: a dictionary with the time per message in nanoseconds for each
+              method ('legacy', 'class').
+    """
+    component = Counter()
+    component._running = True # dispatch as if running, without a thread
+    messages = [ messageClass() for _ in range(batchSize) ]
+    batches = count // batchSize
+
+    def legacy():
+        for _ in range(batches):
+            for message in messages:
+                component.legacyDispatch(message)
+            #for
+        #for
+    #legacy
+
+    def byClass():
+        for _ in range(batches):
+            component._processMessages(messages)
+        #for
+    #byClass
+
+    n = batches * batchSize
+    return { "legacy": bestTime(legacy, rounds) / n * 1e9,
+             "class": bestTime(byClass, rounds) / n * 1e9 }
+#measure
+
+
+def main():
+    P = argparse.ArgumentParser(description=__doc__.strip().split("\n\n")[0])
+    P.add_argument("--messages", type=int, default=200000,
+                   help="messages per round (default: %(default)s)")
+    P.add_argument("--rounds", type=int, default=5,
+                   help="rounds; the fastest counts (default: %(default)s)")
+    A = P.parse_args()
+
+    print("%-14s %6s %12s %12s" % ("message", "batch", "legacy ns",
+                                    "class ns"))
+    for messageClass in (Sample, DerivedSample):
+        for batchSize in (1, 16, 256):
+            result = measure(messageClass, A.messages, batchSize, A.rounds)
+            print("%-14s %6d %12.0f %12.0f" % (messageClass.__name__, batchSize,
+                                               result["legacy"],
+                                               result["class"]))
+        #for
+    #for
+#main
+
+
+if __name__ == '__main__':
+    main()
+#if
+
+### aczutro ###################################################################
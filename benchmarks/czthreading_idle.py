@@ -0,0 +1,99 @@
+#!/usr/bin/env python3
+#
+# Copyright (C) 2005 - present  Alexander Czutro <github@czutro.ch>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# For more details, see the provided licence file or
+# <http://www.gnu.org/licenses>.
+#
+################################################################### aczutro ###
+
+"""
+Measures the idle CPU time and the stop latency of many idle ReactiveThread
+instances that wait for messages without a timeout.
+
+Run from the repository root after sourcing .setenv.  Exits with status 1 if
+a measurement exceeds its limit.
+"""
+
+from czutils.lib import czthreading
+
+import argparse
+import sys
+import time
+
+
+class Idle(czthreading.ReactiveThread):
+    """
+    A component that never receives a message.
+    """
+    def __init__(self, name: str):
+        super().__init__(name, None)
+    #__init__
+#Idle
+
+
+def measure(actors: int, idleTime: float) -> dict:
+    """
+    Starts the actors, lets them idle, and stops them one by one.
+
+    :returns: a dictionary with the process CPU time used while idling
+              ('idleCpu', seconds), and the mean and maximum time
+              ('meanStop', 'maxStop', seconds) that stop() took per actor.
+    """
+    components = [ Idle("idle-%d" % i) for i in range(actors) ]
+    for component in components:
+        component.start()
+    #for
+    time.sleep(0.5) # let all threads reach the blocking get
+    cpuStart = time.process_time()
+    time.sleep(idleTime)
+    idleCpu = time.process_time() - cpuStart
+    stopTimes = []
+    for component in components:
+        start = time.perf_counter()
+        component.stop()
+        stopTimes.append(time.perf_counter() - start)
+    #for
+    return { "idleCpu": idleCpu,
+             "meanStop": sum(stopTimes) / len(stopTimes),
+             "maxStop": max(stopTimes) }
+#measure
+
+
+def main():
+    P = argparse.ArgumentParser(description=__doc__.strip().split("\n\n")[0])
+    P.add_argument("--actors", type=int, default=1000,
+                   help="number of idle actors (default: %(default)s)")
+    P.add_argument("--idle", type=float, default=5.0,
+                   help="seconds to idle (default: %(default)s)")
+    P.add_argument("--max-cpu", type=float, default=0.05,
+                   help="limit for CPU seconds used while idling "
+                        "(default: %(default)s)")
+    P.add_argument("--max-stop", type=float, default=0.01,
+                   help="limit for the mean stop() latency in seconds "
+                        "(default: %(default)s)")
+    A = P.parse_args()
+
+    result = measure(A.actors, A.idle)
+    print("%d idle actors for %.1f s" % (A.actors, A.idle))
+    print("  idle CPU time:   %.4f s" % result["idleCpu"])
+    print("  stop() latency:  mean %.1f us, max %.1f us"
+          % (result["meanStop"] * 1e6, result["maxStop"] * 1e6))
+
+    if result["idleCpu"] > A.max_cpu or result["meanStop"] > A.max_stop:
+        print("FAILED: limit exceeded")
+        sys.exit(1)
+    #if
+#main
+
+
+if __name__ == '__main__':
+    main()
+#if
+
+### aczutro ###################################################################
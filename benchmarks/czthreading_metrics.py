@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+#
+# Copyright (C) 2005 - present  Alexander Czutro <github@czutro.ch>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# For more details, see the provided licence file or
+# <http://www.gnu.org/licenses>.
+#
+################################################################### aczutro ###
+
+"""
+Measures the overhead of runtime metrics (ReactiveThread.enableMetrics) on
+the message throughput of a ReactiveThread.
+
+Run from the repository root after sourcing .setenv.
+"""
+
+from czutils.lib import czthreading
+
+import argparse
+import time
+
+
+class Sample(czthreading.Message):
+    pass
+#Sample
+
+
+class Counter(czthreading.ReactiveThread):
+    """
+    A component whose message processor does nothing but count.
+    """
+    def __init__(self, batchSize: int):
+        super().__init__("counter", batchSize = batchSize)
+        self.count = 0
+    #__init__
+
+    @czthreading.messageProcessor(Sample)
+    def processSample(self, message: Sample):
+        self.count += 1
+    #processSample
+#Counter
+
+
+def measure(metrics: bool, messages: int, batchSize: int) -> float:
+    """
+    Queues the messages, then starts the component and waits for it to
+    process them all.
+
+    :returns: messages per second.
+    """
+    component = Counter(batchSize)
+    component.enableMetrics(metrics)
+    for _ in range(messages):
+        component.comm(Sample())
+    #for
+    component.comm(czthreading.QuitMessage())
+    start = time.perf_counter()
+    component.start()
+    component.wait()
+    return messages / (time.perf_counter() - start)
+#measure
+
+
+def main():
+    P = argparse.ArgumentParser(description=__doc__.strip().split("\n\n")[0])
+    P.add_argument("--messages", type=int, default=200000,
+                   help="messages per round (default: %(default)s)")
+    P.add_argument("--rounds", type=int, default=5,
+                   help="rounds; the fastest counts (default: %(default)s)")
+    A = P.parse_args()
+
+    print("%6s %14s %14s %9s" % ("batch", "off msg/s", "on msg/s",
+                                 "overhead"))
+    for batchSize in (1, 64):
+        rates = { metrics: max(measure(metrics, A.messages, batchSize)
+                               for _ in range(A.rounds))
+                  for metrics in (False, True) }
+        print("%6d %14.0f %14.0f %8.0f%%"
+              % (batchSize, rates[False], rates[True],
+                 (rates[False] / rates[True] - 1) * 100))
+    #for
+#main
+
+
+if __name__ == '__main__':
+    main()
+#if
+
+### aczutro ###################################################################
@@ -0,0 +1,131 @@
+#!/usr/bin/env python3
+#
+# Copyright (C) 2005 - present  Alexander Czutro <github@czutro.ch>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# For more details, see the provided licence file or
+# <http://www.gnu.org/licenses>.
+#
+################################################################### aczutro ###
+
+"""
+Measures how a ReactiveProcessPool with a CPU-bound message processor scales
+with the number of processes, compared with one ReactiveThread.
+
+Run from the repository root after sourcing .setenv.  Scaling is only
+meaningful on a machine with several idle cores.
+"""
+
+from czutils.lib import czthreading
+
+import argparse
+import os
+import time
+
+
+class Work(czthreading.Message):
+    __slots__ = ("n",)
+
+    def __init__(self, n: int):
+        super().__init__()
+        self.n = n
+    #__init__
+#Work
+
+
+def burn(n: int) -> int:
+    """
+    CPU-bound work that holds the GIL.
+    """
+    total = 0
+    for i in range(n):
+        total += i * i
+    #for
+    return total
+#burn
+
+
+class Worker(czthreading.ReactiveProcess):
+    def __init__(self, index: int):
+        super().__init__("worker-%d" % index, batchSize = 16)
+        self.addMessageProcessor(Work, self.processWork)
+    #__init__
+
+    def processWork(self, message: Work):
+        burn(message.n)
+    #processWork
+#Worker
+
+
+class ThreadWorker(czthreading.ReactiveThread):
+    def __init__(self):
+        super().__init__("thread-worker", batchSize = 16)
+        self.addMessageProcessor(Work, self.processWork)
+    #__init__
+
+    def processWork(self, message: Work):
+        burn(message.n)
+    #processWork
+#ThreadWorker
+
+
+def run(component, items: int, size: int) -> float:
+    """
+    Sends the work to a started component, then a QuitMessage, and waits for
+    it to finish.
+
+    :returns: the elapsed time in seconds.
+    """
+    start = time.perf_counter()
+    for _ in range(items):
+        component.comm(Work(size))
+    #for
+    component.comm(czthreading.QuitMessage())
+    component.wait()
+    return time.perf_counter() - start
+#run
+
+
+def main():
+    cores = os.cpu_count() or 1
+    P = argparse.ArgumentParser(description=__doc__.strip().split("\n\n")[0])
+    P.add_argument("--items", type=int, default=2000,
+                   help="number of work messages (default: %(default)s)")
+    P.add_argument("--size", type=int, default=20000,
+                   help="loop iterations per message (default: %(default)s)")
+    P.add_argument("--max-processes", type=int, default=cores,
+                   help="largest pool to measure (default: number of cores, "
+                        "%(default)s)")
+    A = P.parse_args()
+
+    thread = ThreadWorker()
+    thread.start()
+    baseline = run(thread, A.items, A.size)
+    print("%-16s %8.3f s" % ("1 thread", baseline))
+
+    counts = { A.max_processes }
+    processes = 1
+    while processes < A.max_processes:
+        counts.add(processes)
+        processes *= 2
+    #while
+    for processes in sorted(counts):
+        pool = czthreading.ReactiveProcessPool(Worker, processes)
+        pool.start()
+        elapsed = run(pool, A.items, A.size)
+        print("%-16s %8.3f s   speedup %5.2f"
+              % ("%d process%s" % (processes, "" if processes == 1 else "es"),
+                 elapsed, baseline / elapsed))
+    #for
+#main
+
+
+if __name__ == '__main__':
+    main()
+#if
+
+### aczutro ###################################################################
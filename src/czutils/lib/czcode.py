@@ -13,14 +13,48 @@
 """Coding helpers."""
 
 
+def attributes(obj) -> dict:
+    """
+    :returns: the given object's attributes, i.e. the contents of its __dict__
+              (if it has one) and of its __slots__ (also those declared by
+              base classes), in declaration order.  Unset slots are skipped.
+    """
+    result = dict()
+    for klass in reversed(type(obj).__mro__):
+        slots = vars(klass).get("__slots__", ())
+        if isinstance(slots, str):
+            slots = (slots,)
+        #if
+        for slot in slots:
+            if slot in ("__dict__", "__weakref__"):
+                continue
+            #if
+            attr = slot
+            if slot.startswith("__") and not slot.endswith("__"):
+                attr = "_%s%s" % (klass.__name__.lstrip("_"), slot)
+            #if
+            try:
+                result[slot] = getattr(obj, attr)
+            except AttributeError:
+                pass
+            #except
+        #for
+    #for
+    result.update(getattr(obj, "__dict__", {}))
+    return result
+#attributes
+
+
 def autoStr(cls):
     """
     Decorator: auto-generates __str__ method for the given class.
+    Works for classes with __slots__ too.
     """
     cls.__str__ = lambda self : \
         "%s { %s }" \
         % (type(self).__name__,
-           ", ".join("%s = %s" % dictEntry for dictEntry in vars(self).items()))
+           ", ".join("%s = %s" % dictEntry
+                     for dictEntry in attributes(self).items()))
     return cls
 #autoStr
 
@@ -14,25 +14,64 @@
 
 from .czcode import autoStr
 
+import asyncio
+import collections
+import concurrent.futures
+import enum
+import heapq
+import inspect
+import io
+import ipaddress
+import itertools
 import logging
+import mmap
+import multiprocessing
+import multiprocessing.connection
+import os
+import pickle
 import queue
+import random
+import select
+import socket
+import struct
+import sys
+import tempfile
+import time
 import threading
-from typing import Callable
+import traceback
+import typing
+from typing import Callable, Hashable, Iterable
+
+try:
+    import fcntl
+except ImportError: # not a POSIX system; only SharedPayload needs fcntl
+    fcntl = None
+#except
 
 
 _logger = logging.getLogger(__name__)
 
+_QUIT, _UNKNOWN, _SINGLE, _BATCH = range(4)
+
 
 @autoStr
 class Message:
     """
     Base class for messages passed between threads.
+
+    Message declares empty __slots__, so derived classes may declare
+    __slots__ (or be dataclasses with slots=True) to save the memory of a
+    per-instance __dict__, for example:
+
+        class SomeMsgClass(Message):
+            __slots__ = ("key", "value")
+            ...
     """
+    __slots__ = ()
 
     def msgType(self) -> str:
         """
-        Do NOT override this method.  It is used by class ReactiveThread to
-        determine how to process the message.
+        Do NOT override this method.
 
         :returns: this object's class name.
         """
@@ -46,264 +85,5990 @@ class QuitMessage(Message):
     """
     Message that makes class ReactiveThread quit the message-receiving loop.
     """
-    pass
+    __slots__ = ()
 #QuitMessage
 
 
-class Thread:
+class MessagePool:
     """
-    Base class for an asynchronous component.
-    When start() is called, method threadCode()
-    is executed in a separate thread.
+    Free list of message objects of one class, to reduce allocation churn for
+    high-rate message types.
 
-    This class uses the module's logger.  Set the logging level and whether to
-    use colour with setLoggingOptions(level, colour={True|False}).
+    acquire() takes the same arguments as the class's constructor and
+    re-runs __init__ on a recycled instance if one is available.
+    release() returns an instance to the free list.  Only release a message
+    once nothing refers to it anymore, typically at the end of its
+    processor.  acquire() and release() may be called from any thread.
     """
 
-    def __init__(self, name: str):
+    def __init__(self, messageClass: type[Message], size: int = 1024):
         """
         Constructor.
 
-        :param name: The thread's name.
+        :param messageClass: The class of the pooled messages.
+
+        :param size:         Maximum number of free instances kept.
         """
-        super().__init__()
-        self._name = name
-        self._running = False
-        self._thread = None
-        self._lock = threading.Lock()
+        self._messageClass = messageClass
+        self._size = size
+        self._free = collections.deque()
     #__init__
 
 
-    def name(self) -> str:
+    def acquire(self, *args, **kwargs) -> Message:
         """
-        :returns: the thread's name.
+        :returns: a recycled or new instance of the pool's class, initialised
+                  with the given arguments.
         """
-        return self._name
-    #name
+        try:
+            message = self._free.pop()
+        except IndexError:
+            return self._messageClass(*args, **kwargs)
+        #except
+        message.__init__(*args, **kwargs)
+        return message
+    #acquire
 
 
-    def threadCode(self) -> None:
+    def release(self, message: Message) -> None:
         """
-        DO override this method.  This is where the functionality that shall
-        run in a separate thread is to be implemented.
+        Returns a message to the free list, unless the list is full or the
+        message is not an instance of exactly the pool's class.
         """
-        pass
-    #threadCode
+        if type(message) is self._messageClass \
+                and len(self._free) < self._size:
+            self._free.append(message)
+        #if
+    #release
 
+#MessagePool
 
-    def running(self) -> bool:
+
+_CODEC_FORMATS = frozenset("bBhHiIqQfd?")
+_CODEC_TYPE_ID = struct.Struct("<H")
+_CODEC_PICKLED = struct.Struct("<HI")
+_codecTypes = dict()
+
+
+def binaryMessage(typeId: int, **fields: str):
+    """
+    Class decorator that declares typed fields of a Message subclass, so that
+    MessageCodec encodes its instances with struct instead of pickle, and
+    registers the class under a type id.
+
+    Usage:
+
+    @binaryMessage(1, sender = "str", value = "d", count = "q")
+    class Sample(Message):
+        __slots__ = ("sender", "value", "count")
+        ...
+
+    Only the declared fields are encoded, in the given order.  Decoding does
+    not call the constructor.  Derived classes are not covered by the
+    declaration; they are pickled unless declared themselves.
+
+    :param typeId: The class's type id, 1 to 65535.  Must be the same in all
+                   communicating processes and unique among declared classes.
+
+    :param fields: Field name = type: a struct format character for a number
+                   ('b', 'B', 'h', 'H', 'i', 'I', 'q', 'Q', 'f', 'd', '?'),
+                   'str' or 'bytes'.
+
+    :raises ValueError: if the type id or a field type is invalid, or the
+                        type id is taken.
+    """
+    if not 0 < typeId < 65536:
+        raise ValueError("type id must be between 1 and 65535")
+    #if
+    for name, kind in fields.items():
+        if kind not in _CODEC_FORMATS and kind not in ("str", "bytes"):
+            raise ValueError("field '%s' has invalid type '%s'" % (name, kind))
+        #if
+    #for
+
+    def decorator(cls):
+        registered = _codecTypes.get(typeId)
+        if registered is not None and registered is not cls:
+            raise ValueError("type id %d already used by %s"
+                             % (typeId, registered.__name__))
+        #if
+        cls._czCodecFields = (typeId, tuple(fields.items()))
+        _codecTypes[typeId] = cls
+        return cls
+    #decorator
+
+    return decorator
+#binaryMessage
+
+
+class _CodecLayout:
+    """
+    Compiled binary layout of a class declared with binaryMessage().
+    """
+    __slots__ = ("messageClass", "typeId", "struct", "names", "variable")
+
+    def __init__(self, messageClass: type, typeId: int, fields: tuple):
+        self.messageClass = messageClass
+        self.typeId = typeId
+        self.names = tuple(name for name, _ in fields)
+        self.struct = struct.Struct("<H" + "".join(
+            "I" if kind in ("str", "bytes") else kind for _, kind in fields))
+        self.variable = tuple((i, kind == "str")
+                              for i, (_, kind) in enumerate(fields)
+                              if kind in ("str", "bytes"))
+    #__init__
+
+#_CodecLayout
+
+
+class MessageCodec:
+    """
+    Encodes messages to bytes and back.  Instances of classes declared with
+    binaryMessage() are packed with struct: a 2-byte type id followed by the
+    declared fields (strings and bytes with a 4-byte length).  Other messages
+    are pickled, behind a type id of 0 and a 4-byte length.
+
+    Encoded messages are self-delimiting, so that several of them can be
+    concatenated (see encodeMany()).
+    """
+
+    def __init__(self):
+        self._byClass = dict()
+        self._byId = dict()
+    #__init__
+
+
+    def encode(self, message: Message) -> bytes:
         """
-        :returns: the current value of the running flag.
+        :returns: the encoding of a message.
         """
-        return self._running
-    #running
+        messageClass = type(message)
+        try:
+            layout = self._byClass[messageClass]
+        except KeyError:
+            layout = self._byClass[messageClass] = self._layout(messageClass)
+        #except
+        if layout is None:
+            payload = _pickleByValue(message)
+            return _CODEC_PICKLED.pack(0, len(payload)) + payload
+        #if
+        values = [ getattr(message, name) for name in layout.names ]
+        if not layout.variable:
+            return layout.struct.pack(layout.typeId, *values)
+        #if
+        tail = []
+        for i, isString in layout.variable:
+            data = values[i].encode() if isString else values[i]
+            values[i] = len(data)
+            tail.append(data)
+        #for
+        return layout.struct.pack(layout.typeId, *values) + b"".join(tail)
+    #encode
 
 
-    def start(self) -> None:
+    def decode(self, data: bytes) -> Message:
         """
-        Starts the execution of threadCode(), sets the running flag to True,
-        and returns immediately.  threadCode() will continue to run in a
-        separate thread.
+        :returns: the message encoded in 'data'.
 
-        If threadCode() is already running, does nothing.
+        :raises ValueError: if the type id is unknown.
         """
-        self._lock.acquire()
-        if self._running:
-            _logger.warning("thread", self._name, "already running")
-        else:
-            self._running = True
-            self._thread = threading.Thread(target = self._threadCode,
-                                            name = self._name,
-                                            daemon = True)
-            self._thread.start()
-        #else
-        self._lock.release()
-    #start
+        return self.decodeFrom(data, 0)[0]
+    #decode
 
 
-    def stop(self) -> None:
+    def encodeMany(self, messages: Iterable[Message]) -> bytes:
         """
-        Sets the running flag to False and waits for threadCode() to return.
-        It is your responsibility to implement code in threadCode() that
-        checks whether a stop has been requested.
-
-        Will block for ever if threadCode() doesn't return.  However, if
-        threadCode is NOT running (because not started or already finished),
-        returns immediately without blocking.
+        :returns: the concatenated encodings of several messages.
         """
-        self._lock.acquire()
-        if self._running and self._thread is not None:
-            self._running = False
-            self._thread.join()
-            self._thread = None
-        #if
-        self._lock.release()
-    #stop
+        encode = self.encode
+        return b"".join([ encode(message) for message in messages ])
+    #encodeMany
 
 
-    def wait(self) -> None:
+    def decodeMany(self, data: bytes) -> list[Message]:
         """
-        Waits for threadCode to return, but does not request a stop.
+        :returns: the messages encoded in 'data' by encodeMany().
 
-        Will block for ever if threadCode() doesn't return.  However, if
-        threadCode is NOT running (because not started or already finished),
-        returns immediately without blocking.
+        :raises ValueError: if a type id is unknown.
         """
-        self._lock.acquire()
-        if self._running and self._thread is not None:
-            self._thread.join()
-            self._thread = None
-        #if
-        self._lock.release()
-    #wait
+        messages = []
+        offset = 0
+        decodeFrom = self.decodeFrom
+        while offset < len(data):
+            message, offset = decodeFrom(data, offset)
+            messages.append(message)
+        #while
+        return messages
+    #decodeMany
 
 
-    def _threadCode(self):
+    def decodeFrom(self, data: bytes, offset: int) -> tuple[Message, int]:
+        """
+        Decodes the message that starts at 'offset' in 'data'.
+
+        :returns: the message and the offset of the byte that follows it.
+
+        :raises ValueError: if the type id is unknown.
+        """
+        typeId, = _CODEC_TYPE_ID.unpack_from(data, offset)
+        if typeId == 0:
+            _, size = _CODEC_PICKLED.unpack_from(data, offset)
+            start = offset + _CODEC_PICKLED.size
+            return pickle.loads(data[start:start + size]), start + size
+        #if
         try:
-            _logger.info("starting thread '%s'" % self._name)
-            self.threadCode()
-            self._running = False
-            _logger.info("terminating thread '%s'" % self._name)
-        except Exception as e:
-            _logger.error("exception in thread '%s'" % self._name, e)
-            raise e
+            layout = self._byId[typeId]
+        except KeyError:
+            messageClass = _codecTypes.get(typeId)
+            if messageClass is None:
+                raise ValueError("unknown message type id %d" % typeId)
+            #if
+            layout = self._byId[typeId] = self._layout(messageClass)
         #except
-    #_threadCode
+        values = layout.struct.unpack_from(data, offset)
+        offset += layout.struct.size
+        if layout.variable:
+            values = list(values)
+            for i, isString in layout.variable:
+                end = offset + values[i + 1]
+                values[i + 1] = data[offset:end].decode() if isString \
+                    else bytes(data[offset:end])
+                offset = end
+            #for
+        #if
+        messageClass = layout.messageClass
+        message = messageClass.__new__(messageClass)
+        for name, value in zip(layout.names, values[1:]):
+            setattr(message, name, value)
+        #for
+        return message, offset
+    #decodeFrom
 
-#Thread
 
+    @staticmethod
+    def _layout(messageClass: type) -> _CodecLayout|None:
+        """
+        :returns: the layout of a class declared with binaryMessage(), or None
+                  if the class is not declared.
+        """
+        declaration = messageClass.__dict__.get("_czCodecFields")
+        if declaration is None:
+            return None
+        #if
+        return _CodecLayout(messageClass, *declaration)
+    #_layout
 
-class ReactiveThread(Thread):
-    """
-    Base class for an asynchronous component with a standard infinite loop for
-    message processing.
+#MessageCodec
 
-    The component waits for incoming messages and processes them serially (in
-    receival order) until either a QuitMessage is received, or until
-    the running flag is set to False (e.g. call to stop()).
-    Note that if the running flag is set to False, the loop is exited as soon as
-    possible, so some queued messages may remain unprocessed.
 
-    The right way to derive from this class is to define a method for each class
-    of messages that may be sent to the component, for example:
+class SharedPayload:
+    """
+    Handle to a large payload in shared memory (a memory-mapped file, in
+    /dev/shm where available), to be put into messages that cross process
+    boundaries.  Pickling a handle, as when a message is sent to a
+    ReactiveProcess or through an ActorClient on the same host, transfers
+    only the file name, and the receiver maps the same memory: the payload
+    itself is written once and never copied.  Available on POSIX systems
+    only.
 
-        def processSomeMsgClass(message: SomeMsgClass) -> None:
-            ...
+    The file is reference-counted across processes.  Each handle holds one
+    reference: every pickling of a handle adds one for the handle that will
+    be unpickled, and share() adds one for a handle in the same process.
+    Every holder must call release() (or let the handle be garbage
+    collected) when done; the last release removes the file.  A pickled
+    handle that is never unpickled, or a handle inherited by a forked
+    process, does not follow these rules and must be accounted for by the
+    caller.
 
-    where SomeMsgClass derives from Message.
+    Where this module serialises messages itself (TraceRecorder,
+    SpillingMailbox and the pickle fallback of MessageCodec), handles are
+    serialised by value: the payload is copied, no reference is added, and
+    unpickling creates a new payload.  Such copies may be dropped freely.
+    """
 
-    Then, register those message processing methods by calling
-    addMessageProcessor in __init__, for example:
+    _HEADER = struct.Struct("<q") # reference count
+    _lock = threading.RLock() # file locks do not exclude threads
 
-        self.addMessageProcessor("SomeMsgClass", self.processSomeMsgClass)
+    def __init__(self, size: int, directory: str|None = None):
+        """
+        Constructor.  Creates a zero-filled payload; write it through view().
 
-    This class uses the module's logger.  Set the logging level and whether to
-    use colour with setLoggingOptions(level, colour={True|False}).
-    """
+        :param size:      The payload's size in bytes.
 
-    def __init__(self, name: str, messageWaitingTime: float):
+        :param directory: Directory for the backing file.  If None, /dev/shm
+                          if it exists, else the system's temporary directory.
+
+        :raises NotImplementedError: if the system is not POSIX.
         """
-        Constructor.
+        _requirePosix()
+        if directory is None:
+            directory = "/dev/shm" if os.path.isdir("/dev/shm") \
+                else tempfile.gettempdir()
+        #if
+        fd, path = tempfile.mkstemp(prefix = "czpayload-", dir = directory)
+        try:
+            os.ftruncate(fd, self._HEADER.size + size)
+            os.pwrite(fd, self._HEADER.pack(1), 0)
+        except OSError:
+            os.close(fd)
+            os.unlink(path)
+            raise
+        #except
+        self._open(path, size, fd)
+    #__init__
 
-        :param name:               The thread's name.
 
-        :param messageWaitingTime: Maximum time in seconds to wait for the next
-                                   message.  If None, wait for ever.
-                                   (However, that will block the component if no
-                                   messages arrive.)
-                                   This is a performance parameter only.
-                                   Messages are NEVER dropped and ALWAYS
-                                   processed as soon as possible.
-                                   If this parameter's value is too small,
-                                   it may result in busy waiting.
+    @classmethod
+    def fromBytes(cls, data, directory: str|None = None) -> "SharedPayload":
         """
-        super().__init__(name)
-        self._messageWaitingTime = messageWaitingTime
-        self._messageProcessor = dict()
-        self._messages = queue.Queue()
-    #__init__
+        :param data:      Any object that supports the buffer protocol, e.g.
+                          bytes, bytearray or an array.
 
+        :param directory: See constructor.
 
-    def addMessageProcessor(self,
-                            messageType: str,
-                            method: Callable[[Message], None]) -> None:
+        :returns: a new payload that holds a copy of 'data'.
         """
-        Register a message processor, i.e. a method that will be used to process
-        messages of a particular class.
+        data = memoryview(data).cast("B")
+        payload = cls(len(data), directory)
+        payload._view[:] = data
+        return payload
+    #fromBytes
 
-        Use this method only within __init__.
 
-        :param messageType: The message's class name.
+    def view(self) -> memoryview:
+        """
+        :returns: a writable view of the payload, without copying.  It must not
+                  be used after release().
+        """
+        if self._view is None:
+            raise ValueError("payload has been released")
+        #if
+        return self._view[:]
+    #view
 
-        :param method:      A method that takes a message of the class in
-                            question and returns None.  May be a static
-                            function.
+
+    def size(self) -> int:
         """
-        self._messageProcessor[messageType] = method
-    #addMessageProcessor
+        :returns: the payload's size in bytes.
+        """
+        return self._size
+    #size
 
 
-    def comm(self, message: Message) -> None:
+    def references(self) -> int:
+        """
+        :returns: the number of handles to the payload that are not released,
+                  in all processes.
         """
-        Queues up a message and returns immediately.
+        return self._adjustReferences(0)
+    #references
 
-        :param message: An instance of a class derived from Message.
+
+    def share(self) -> "SharedPayload":
         """
-        self._messages.put(message, block = True, timeout = None)
-    #comm
+        :returns: a new handle to the same payload, e.g. for another component
+                  in the same process.  It must be released separately.
+        """
+        self._adjustReferences(1)
+        handle = SharedPayload.__new__(SharedPayload)
+        handle._open(self._path, self._size)
+        return handle
+    #share
 
 
-    def threadCodePre(self) -> None:
+    def release(self) -> None:
         """
-        Override this method to implement code that needs to be executed
-        once BEFORE the message processing loop.
+        Gives up this handle.  If it was the last one, removes the backing
+        file; the memory is freed when the last view of it is gone.  Does
+        nothing if the handle was released already.
         """
-        pass
-    #threadCodePre
+        if self._view is None:
+            return
+        #if
+        if self._adjustReferences(-1) == 0:
+            try:
+                os.unlink(self._path)
+            except OSError:
+                pass  # already removed
+            #except
+        #if
+        self._view.release()
+        self._view = None
+        try:
+            self._mmap.close()
+        except BufferError:
+            pass  # views still exist; unmapped when they are gone
+        #except
+        self._mmap = None
+        with SharedPayload._lock:
+            os.close(self._fd) # also drops this process's file locks
+        #with
+    #release
 
 
-    def threadCodePost(self) -> None:
+    def __getstate__(self) -> dict:
+        if self._view is None:
+            raise ValueError("payload has been released")
+        #if
+        if getattr(_pickling, "byValue", False):
+            return { "data": bytes(self._view) }
+        #if
+        self._adjustReferences(1)
+        return { "path": self._path, "size": self._size }
+    #__getstate__
+
+
+    def __setstate__(self, state: dict) -> None:
+        if "data" in state:
+            data = state["data"]
+            self.__init__(len(data))
+            self._view[:] = data
+        else:
+            self._open(state["path"], state["size"])
+        #else
+    #__setstate__
+
+
+    def __del__(self) -> None:
+        if getattr(self, "_view", None) is not None:
+            self.release()
+        #if
+    #__del__
+
+
+    def _open(self, path: str, size: int, fd: int|None = None) -> None:
         """
-        Override this method to implement code that needs to be executed
-        once AFTER the message processing loop.
+        Maps the backing file.
         """
-        pass
-    #threadCodePost
+        _requirePosix()
+        if fd is None:
+            fd = os.open(path, os.O_RDWR)
+        #if
+        self._path = path
+        self._size = size
+        self._fd = fd
+        self._mmap = mmap.mmap(fd, self._HEADER.size + size)
+        self._view = memoryview(self._mmap)[self._HEADER.size:]
+    #_open
 
 
-    def threadCode(self) -> None:
+    def _adjustReferences(self, delta: int) -> int:
         """
-        Do NOT override this method.
-        This is where the message processing loop is implemented.
+        Adds 'delta' to the reference count, under an exclusive file lock.
+
+        :returns: the new reference count.
         """
-        self.threadCodePre()
-        while self._running:
+        with SharedPayload._lock:
+            fcntl.lockf(self._fd, fcntl.LOCK_EX)
             try:
-                message = self._messages.get(block = True,
-                                             timeout = self._messageWaitingTime)
-                messageType = message.msgType()
-                _logger.info("%s: received message of type %s"
-                             % (self.name(), messageType))
-                if messageType == "QuitMessage":
-                    _logger.info("%s: received QuitMessage" % self.name())
-                    break
-                else:
-                    try:
-                        self._messageProcessor[messageType](message)
-                    except KeyError:
-                        _logger.warning(
-                            "%s: don't know what to do with messages of type %s"
-                            % (self.name(), messageType))
-                    #except
-                #else
-            except queue.Empty:
-                pass
-            #except
-        #while
-        self.threadCodePost()
-    #threadCode
+                count, = self._HEADER.unpack_from(self._mmap, 0)
+                count += delta
+                self._HEADER.pack_into(self._mmap, 0, count)
+            finally:
+                fcntl.lockf(self._fd, fcntl.LOCK_UN)
+            #finally
+        #with
+        return count
+    #_adjustReferences
 
-#ReactiveThread
+#SharedPayload
+
+
+def _requirePosix() -> None:
+    if fcntl is None:
+        raise NotImplementedError("SharedPayload requires a POSIX system")
+    #if
+#_requirePosix
+
+
+_pickling = threading.local()
+
+
+def _pickleByValue(obj) -> bytes:
+    """
+    Pickles an object for storage: SharedPayload handles in it are pickled by
+    value, without adding references.
+    """
+    _pickling.byValue = True
+    try:
+        return pickle.dumps(obj, pickle.HIGHEST_PROTOCOL)
+    finally:
+        _pickling.byValue = False
+    #finally
+#_pickleByValue
+
+
+def messageProcessor(*messageTypes: type[Message]|str, batch: bool = False):
+    """
+    Decorator: registers a method of a ReactiveThread subclass as the message
+    processor for the given message classes, as if addMessageProcessor (or
+    addBatchMessageProcessor if 'batch' is True) had been called in __init__
+    for each of them, for example:
+
+        @messageProcessor(SomeMsgClass)
+        def processSomeMsgClass(self, message: SomeMsgClass) -> None:
+            ...
+
+    :param messageTypes: Message classes or class names.
+
+    :param batch:        If True, the method is a batch message processor.
+
+    A subclass that overrides a decorated method without decorating it again
+    keeps the registration, i.e. the override is used.
+    """
+    def decorator(method):
+        method._czMessageTypes = (messageTypes, batch)
+        return method
+    #decorator
+    return decorator
+#messageProcessor
+
+
+class MailboxFull(Exception):
+    """Raised when a full mailbox rejects a message."""
+    pass
+#MailboxFull
+
+
+class UnknownMessageError(Exception):
+    """Set on the future of an asked message that has no processor."""
+    pass
+#UnknownMessageError
+
+
+class OverflowPolicy(enum.Enum):
+    """
+    What Mailbox.put() does if the mailbox is full:
+
+    - BLOCK:       wait until there is room, or raise MailboxFull if the
+                   mailbox's timeout expires first.
+    - REJECT:      raise MailboxFull.
+    - DROP_OLDEST: drop the oldest queued message to make room.
+    - DROP_NEWEST: drop the new message.
+    - COALESCE:    replace the newest queued message with the same coalescing
+                   key by the new message.  If there is no such message,
+                   behave like BLOCK.
+    """
+    BLOCK = enum.auto()
+    REJECT = enum.auto()
+    DROP_OLDEST = enum.auto()
+    DROP_NEWEST = enum.auto()
+    COALESCE = enum.auto()
+#OverflowPolicy
+
+
+class _Slot:
+    """
+    Mutable placeholder for a coalescable message in a Mailbox.
+    """
+    __slots__ = ("message", "key")
+
+    def __init__(self, message: Message, key: Hashable):
+        self.message = message
+        self.key = key
+    #__init__
+
+#_Slot
+
+
+class _Envelope:
+    """
+    Wrapper for a message sent with ask() or while metrics or recording are
+    enabled, which carries the future for the reply, the time after which the
+    message is discarded, the time it was queued up, and the trace recorder
+    and sequence number of the message.
+    """
+    __slots__ = ("message", "future", "deadline", "enqueued", "trace")
+
+    def __init__(self,
+                 message: Message,
+                 future: concurrent.futures.Future|None,
+                 deadline: float|None,
+                 enqueued: float|None = None):
+        self.message = message
+        self.future = future
+        self.deadline = deadline
+        self.enqueued = enqueued
+        self.trace = None
+    #__init__
+
+#_Envelope
+
+
+def _unwrap(item) -> Message:
+    """
+    :returns: the message contained in a mailbox item.
+    """
+    if type(item) is _Slot:
+        item = item.message
+    #if
+    if type(item) is _Envelope:
+        item = item.message
+    #if
+    return item
+#_unwrap
+
+
+def _discard(item) -> None:
+    """
+    Cancels the reply future of a mailbox item that is dropped.
+    """
+    if type(item) is _Slot:
+        item = item.message
+    #if
+    if type(item) is _Envelope and item.future is not None:
+        item.future.cancel()
+    #if
+#_discard
+
+
+def _deadline(ttl: float|None, deadline: float|None) -> float|None:
+    """
+    :returns: the earlier of 'deadline' and the time 'ttl' seconds from now,
+              as a time.monotonic() value, or None if both are None.
+    """
+    if ttl is not None:
+        expiry = time.monotonic() + ttl
+        if deadline is None or expiry < deadline:
+            deadline = expiry
+        #if
+    #if
+    return deadline
+#_deadline
+
+
+class Mailbox:
+    """
+    FIFO message queue used by class ReactiveThread.
+
+    Unlike queue.Queue, a consumer can take several messages per lock
+    acquisition and wakeup with get(), and a blocked consumer can be woken up
+    without a message with interrupt().
+
+    The mailbox is unbounded by default.  If a capacity is given, put()
+    applies the overflow policy when the mailbox is full.  QuitMessages are
+    always accepted and never dropped.
+
+    Subclasses may change how messages are stored by overriding _size(),
+    _enqueue(), _enqueueFront(), _dequeue() and _evictOldest(), which are
+    always called with the mailbox's lock held.
+    """
+
+    def __init__(self,
+                 capacity: int|None = None,
+                 overflow: OverflowPolicy = OverflowPolicy.BLOCK,
+                 timeout: float|None = None,
+                 coalesceKey: Callable[[Message], Hashable]|None = None):
+        """
+        Constructor.
+
+        :param capacity:    Maximum number of queued messages.  If None, the
+                            mailbox is unbounded.
+
+        :param overflow:    What put() does if the mailbox is full.
+
+        :param timeout:     With OverflowPolicy.BLOCK or COALESCE: maximum time
+                            in seconds put() waits for room.  If None, wait for
+                            ever.
+
+        :param coalesceKey: With OverflowPolicy.COALESCE: a function that maps
+                            a message to its coalescing key, or to None if the
+                            message must not be coalesced.
+        """
+        if capacity is not None and capacity < 1:
+            raise ValueError("'capacity' must be >= 1")
+        #if
+        if overflow is OverflowPolicy.COALESCE and coalesceKey is None:
+            raise ValueError("OverflowPolicy.COALESCE requires 'coalesceKey'")
+        #if
+        self._capacity = capacity
+        self._overflow = overflow
+        self._timeout = timeout
+        self._coalesceKey = \
+            coalesceKey if overflow is OverflowPolicy.COALESCE else None
+        self._slots = dict()
+        self._items = collections.deque()
+        self._lock = threading.Lock()
+        self._notEmpty = threading.Condition(self._lock)
+        self._notFull = threading.Condition(self._lock)
+        self._interrupted = False
+        self._interruptOnQuit = False # set by ReactiveThreadPool
+        self._listener = None
+        self._dropped = 0
+        self._coalesced = 0
+        self._rejected = 0
+    #__init__
+
+
+    def capacity(self) -> int|None:
+        """
+        :returns: the maximum number of queued messages, or None if unbounded.
+        """
+        return self._capacity
+    #capacity
+
+
+    def qsize(self) -> int:
+        """
+        :returns: the number of messages currently queued.
+        """
+        return self._size()
+    #qsize
+
+
+    def droppedCount(self) -> int:
+        """
+        :returns: the number of messages dropped by OverflowPolicy.DROP_OLDEST
+                  or DROP_NEWEST so far.
+        """
+        return self._dropped
+    #droppedCount
+
+
+    def coalescedCount(self) -> int:
+        """
+        :returns: the number of queued messages replaced by newer ones with
+                  OverflowPolicy.COALESCE so far.
+        """
+        return self._coalesced
+    #coalescedCount
+
+
+    def rejectedCount(self) -> int:
+        """
+        :returns: the number of times put() raised MailboxFull so far.
+        """
+        return self._rejected
+    #rejectedCount
+
+
+    def put(self, message: Message) -> None:
+        """
+        Appends a message and wakes up a waiting consumer.  If the mailbox is
+        full, applies the overflow policy.
+
+        :param message: An instance of a class derived from Message.
+
+        :raises MailboxFull: if the message cannot be queued.
+        """
+        with self._lock:
+            if not self._putLocked(message):
+                return
+            #if
+            self._notEmpty.notify()
+        #with
+        if self._listener is not None:
+            self._listener()
+        #if
+    #put
+
+
+    def putMany(self, messages: list) -> None:
+        """
+        Appends several messages, taking the lock only once unless it has to
+        wait for room.  Each message is subject to the overflow policy, as
+        with put().
+
+        :param messages: A list of messages, oldest first.
+
+        :raises MailboxFull: if a message cannot be queued.  The messages
+                             before it remain queued.
+        """
+        queued = 0
+        try:
+            with self._lock:
+                pending = 0
+                try:
+                    for message in messages:
+                        if pending and self._capacity is not None \
+                                and self._size() >= self._capacity:
+                            # wake up consumers before waiting for room
+                            self._notEmpty.notify(pending)
+                            pending = 0
+                        #if
+                        if self._putLocked(message):
+                            pending += 1
+                            queued += 1
+                        #if
+                    #for
+                finally:
+                    if pending:
+                        self._notEmpty.notify(pending)
+                    #if
+                #finally
+            #with
+        finally:
+            if queued and self._listener is not None:
+                self._listener()
+            #if
+        #finally
+    #putMany
+
+
+    def putBack(self, messages: list) -> None:
+        """
+        Puts messages taken with get() back at the head of the queue, so that
+        they are the next ones to be returned, in their original order.
+        Ignores the capacity.
+
+        :param messages: A list of messages, oldest first.
+        """
+        with self._lock:
+            self._enqueueFront(messages)
+            self._notEmpty.notify()
+        #with
+    #putBack
+
+
+    def setListener(self, listener: Callable[[], None]|None) -> None:
+        """
+        Sets a function that is called, without the mailbox's lock held, after
+        each put() or putMany() that queued up a message.
+
+        :param listener: The function, or None to remove it.
+        """
+        self._listener = listener
+    #setListener
+
+
+    def interrupt(self) -> None:
+        """
+        Makes all current and future calls to get() return an empty list
+        immediately, until clearInterrupt() is called.
+        """
+        with self._lock:
+            self._interrupted = True
+            self._notEmpty.notify_all()
+        #with
+    #interrupt
+
+
+    def clearInterrupt(self) -> None:
+        """
+        Undoes interrupt().
+        """
+        with self._lock:
+            self._interrupted = False
+        #with
+    #clearInterrupt
+
+
+    def get(self, maxItems: int, timeout: float|None) -> list:
+        """
+        Waits for at least one message and removes up to 'maxItems' messages
+        from the head of the queue.
+
+        :param maxItems: Maximum number of messages to return.  Must be >= 1.
+
+        :param timeout:  Maximum time in seconds to wait for the first message.
+                         If None, wait for ever.
+
+        :returns: a list of messages, oldest first.  Empty if the timeout
+                  expired or if the mailbox is interrupted.
+        """
+        with self._lock:
+            if not self._size() and not self._interrupted:
+                self._notEmpty.wait_for(
+                    lambda : self._interrupted or self._size(), timeout)
+            #if
+            if self._interrupted:
+                return []
+            #if
+            messages = self._dequeue(maxItems)
+            if self._capacity is not None and messages:
+                self._notFull.notify(len(messages))
+            #if
+            if self._coalesceKey is not None:
+                messages = [ self._unslot(item) for item in messages ]
+            #if
+            if self._interruptOnQuit:
+                for message in messages:
+                    if isinstance(_unwrap(message), QuitMessage):
+                        # nobody may take messages queued after the quit
+                        self._interrupted = True
+                        self._notEmpty.notify_all()
+                        break
+                    #if
+                #for
+            #if
+        #with
+        return messages
+    #get
+
+
+    def _putLocked(self, message: Message) -> bool:
+        """
+        Applies the capacity, overflow policy and coalescing to a message and
+        enqueues it.  Called with the lock held.
+
+        :returns: True iff a new mailbox item was enqueued.
+        """
+        if self._capacity is not None \
+                and self._size() >= self._capacity \
+                and not isinstance(_unwrap(message), QuitMessage) \
+                and not self._overflowPut(message):
+            return False
+        #if
+        if self._coalesceKey is not None:
+            payload = _unwrap(message)
+            key = None if isinstance(payload, QuitMessage) \
+                else self._coalesceKey(payload)
+            if key is not None:
+                slot = self._slots[key] = _Slot(message, key)
+                message = slot
+            #if
+        #if
+        self._enqueue(message)
+        return True
+    #_putLocked
+
+
+    def _overflowPut(self, message: Message) -> bool:
+        """
+        Applies the overflow policy to a message that arrives while the mailbox
+        is full.
+
+        :returns: True iff the message must still be enqueued.
+        """
+        overflow = self._overflow
+        if overflow is OverflowPolicy.COALESCE:
+            key = self._coalesceKey(_unwrap(message))
+            slot = self._slots.get(key) if key is not None else None
+            if slot is not None:
+                _discard(slot.message)
+                slot.message = message
+                self._coalesced += 1
+                return False
+            #if
+        #if
+        if overflow is OverflowPolicy.BLOCK \
+                or overflow is OverflowPolicy.COALESCE:
+            if not self._notFull.wait_for(
+                    lambda : self._size() < self._capacity, self._timeout):
+                self._rejected += 1
+                raise MailboxFull
+            #if
+            return True
+        elif overflow is OverflowPolicy.REJECT:
+            self._rejected += 1
+            raise MailboxFull
+        elif overflow is OverflowPolicy.DROP_OLDEST and self._evictOldest():
+            self._dropped += 1
+            return True
+        else:
+            _discard(message)
+            self._dropped += 1
+            return False
+        #else
+    #_overflowPut
+
+
+    def _unslot(self, item):
+        if type(item) is _Slot:
+            if self._slots.get(item.key) is item:
+                del self._slots[item.key]
+            #if
+            return item.message
+        #if
+        return item
+    #_unslot
+
+
+    def _size(self) -> int:
+        return len(self._items)
+    #_size
+
+
+    def _enqueue(self, item) -> None:
+        self._items.append(item)
+    #_enqueue
+
+
+    def _enqueueFront(self, items: list) -> None:
+        self._items.extendleft(reversed(items))
+    #_enqueueFront
+
+
+    def _dequeue(self, maxItems: int) -> list:
+        items = self._items
+        if maxItems == 1 or len(items) <= 1:
+            return [items.popleft()] if items else []
+        #if
+        return [ items.popleft() for _ in range(min(maxItems, len(items))) ]
+    #_dequeue
+
+
+    def _evictOldest(self) -> bool:
+        """
+        Removes the oldest queued message unless it is a QuitMessage.
+
+        :returns: True iff a message was removed.
+        """
+        if isinstance(_unwrap(self._items[0]), QuitMessage):
+            return False
+        #if
+        item = self._items.popleft()
+        _discard(item)
+        self._unslot(item)
+        return True
+    #_evictOldest
+
+#Mailbox
+
+
+class PriorityMailbox(Mailbox):
+    """
+    Mailbox with several priority lanes.  Lane 0 has the highest priority.
+    Within a lane, messages are FIFO.
+
+    get() serves the lanes by weighted fair dequeuing: each lane may deliver
+    up to its weight in messages per round, higher-priority lanes first, so
+    that lower-priority lanes are never starved.
+
+    Optionally, QuitMessages travel on an express lane that is always served
+    first.  Note that, in this case, messages queued before a QuitMessage may
+    remain unprocessed.
+
+    Capacity and overflow policy apply to all lanes together.
+    OverflowPolicy.DROP_OLDEST drops the oldest message of the
+    lowest-priority non-empty lane.
+    """
+
+    def __init__(self,
+                 lanes: int = 2,
+                 weights: tuple[int, ...]|None = None,
+                 laneOf: Callable[[Message], int]|None = None,
+                 expressQuit: bool = True,
+                 **kwargs):
+        """
+        Constructor.
+
+        :param lanes:       Number of lanes.  Must be >= 1.
+
+        :param weights:     Number of messages each lane may deliver per round.
+                            All weights must be >= 1.  If None, lane i gets
+                            weight 2 ** (lanes - 1 - i).
+
+        :param laneOf:      A function that maps a message to its lane.
+                            If None, a message's lane is its attribute 'lane'
+                            if it has one, else the lowest-priority lane.
+
+        :param expressQuit: If True, QuitMessages travel on the express lane.
+
+        :param kwargs:      Passed on to Mailbox, e.g. capacity and overflow.
+        """
+        if lanes < 1:
+            raise ValueError("'lanes' must be >= 1")
+        #if
+        if weights is None:
+            weights = tuple(2 ** (lanes - 1 - i) for i in range(lanes))
+        #if
+        if len(weights) != lanes or min(weights) < 1:
+            raise ValueError("'weights' must be 'lanes' integers >= 1")
+        #if
+        super().__init__(**kwargs)
+        self._lanes = tuple(collections.deque() for _ in range(lanes))
+        self._weights = list(weights)
+        self._credits = list(weights)
+        self._laneOf = laneOf if laneOf is not None \
+            else lambda message : getattr(message, "lane", lanes - 1)
+        self._expressQuit = expressQuit
+        self._express = collections.deque()
+        self._count = 0
+    #__init__
+
+
+    def laneSizes(self) -> tuple[int, ...]:
+        """
+        :returns: the number of messages currently queued in each lane
+                  (not counting the express lane).
+        """
+        with self._lock:
+            return tuple(len(lane) for lane in self._lanes)
+        #with
+    #laneSizes
+
+
+    def _size(self) -> int:
+        return self._count
+    #_size
+
+
+    def _enqueue(self, item) -> None:
+        message = _unwrap(item)
+        if self._expressQuit and isinstance(message, QuitMessage):
+            self._express.append(item)
+        else:
+            self._lanes[self._laneOf(message)].append(item)
+        #else
+        self._count += 1
+    #_enqueue
+
+
+    def _enqueueFront(self, items: list) -> None:
+        # put-back messages are served before all lanes
+        self._express.extendleft(reversed(items))
+        self._count += len(items)
+    #_enqueueFront
+
+
+    def _dequeue(self, maxItems: int) -> list:
+        items = []
+        express = self._express
+        while len(items) < maxItems and self._count:
+            if express:
+                items.append(express.popleft())
+            else:
+                items.append(self._dequeueWeighted())
+            #else
+            self._count -= 1
+        #while
+        return items
+    #_dequeue
+
+
+    def _dequeueWeighted(self):
+        """
+        :returns: the next message from the lanes.  At least one lane must be
+                  non-empty.
+        """
+        credits = self._credits
+        while True:
+            for lane, items in enumerate(self._lanes):
+                if items and credits[lane]:
+                    credits[lane] -= 1
+                    return items.popleft()
+                #if
+            #for
+            credits[:] = self._weights
+        #while
+    #_dequeueWeighted
+
+
+    def _evictOldest(self) -> bool:
+        for items in reversed(self._lanes):
+            if items:
+                item = items.popleft()
+                _discard(item)
+                self._unslot(item)
+                self._count -= 1
+                return True
+            #if
+        #for
+        return False
+    #_evictOldest
+
+#PriorityMailbox
+
+
+class SpillingMailbox(Mailbox):
+    """
+    Unbounded mailbox that keeps at most 'hotCapacity' messages in memory and
+    spills the overflow to append-only segment files in a directory, so that
+    no message is dropped and memory stays bounded.  Spilled messages are
+    read back in order, at most 'hotCapacity' at a time, when the messages
+    in memory have all been taken.  Only messages put back with putBack()
+    can exceed 'hotCapacity'.
+
+    Messages are serialised with pickle by default.  Spilled messages lose
+    what only makes sense within the process: TTLs, metrics timestamps, and
+    reply futures of asked messages (which are cancelled).
+
+    Each spilled message is written to its segment file unbuffered, before
+    put() returns.  A segment file is deleted once all its messages have been
+    taken from the mailbox; if the process dies before that, its messages are
+    delivered again after a restart.  Messages held in memory are lost then.
+    After the component has stopped, persist() writes them to disk as well;
+    a new SpillingMailbox on the same directory then resumes the whole
+    backlog.  Messages that were
+    taken from the mailbox but not processed are not saved.
+    """
+
+    _LENGTH = struct.Struct("<I")
+    _SUFFIX = ".spill"
+
+    def __init__(self,
+                 directory: str,
+                 hotCapacity: int = 10000,
+                 segmentSize: int = 10000,
+                 dumps: Callable[[Message], bytes]|None = None,
+                 loads: Callable[[bytes], Message]|None = None):
+        """
+        Constructor.  Resumes the backlog of segment files already in the
+        directory.
+
+        :param directory:   Directory for the segment files; created if it
+                            does not exist.  Must not be shared with another
+                            mailbox.
+
+        :param hotCapacity: Maximum number of messages held in memory before
+                            messages are spilled.  Must be >= 1.
+
+        :param segmentSize: Number of messages per segment file.  Must be >= 1.
+
+        :param dumps:       Serialiser, e.g. MessageCodec().encode.  If None,
+                            pickle is used.
+
+        :param loads:       Deserialiser that matches 'dumps'.
+        """
+        if hotCapacity < 1 or segmentSize < 1:
+            raise ValueError("'hotCapacity' and 'segmentSize' must be >= 1")
+        #if
+        super().__init__()
+        self._directory = directory
+        self._hotCapacity = hotCapacity
+        self._segmentSize = segmentSize
+        self._dumps = dumps if dumps is not None \
+            else _pickleByValue
+        self._loads = loads if loads is not None else pickle.loads
+        # [number, path, records written, records read, read offset]
+        self._segments = collections.deque()
+        self._spilled = 0
+        self._writer = None
+        self._consumed = None
+        os.makedirs(directory, exist_ok = True)
+        for number, path in sorted(self._segmentFiles()):
+            count = self._countRecords(path)
+            self._segments.append([number, path, count, 0, 0])
+            self._spilled += count
+        #for
+    #__init__
+
+
+    def spilledCount(self) -> int:
+        """
+        :returns: the number of queued messages that are on disk.
+        """
+        return self._spilled
+    #spilledCount
+
+
+    def persist(self) -> None:
+        """
+        Writes the messages held in memory to disk, ahead of the spilled
+        ones.  Call this after the component has stopped, so that its whole
+        backlog survives a restart.  The mailbox remains usable.
+        """
+        with self._lock:
+            if self._consumed is not None:
+                self._unlink(self._consumed)
+                self._consumed = None
+            #if
+            head = self._segments[0] if self._segments else None
+            # a partly read head segment is rewritten without the records
+            # already taken, which would otherwise be delivered again
+            partial = head is not None and head[3] > 0
+            if self._items or partial:
+                number = head[0] - 1 if head is not None else 0
+                path = self._segmentPath(number)
+                count = len(self._items)
+                with open(path, "wb") as f:
+                    for item in self._items:
+                        self._write(f, item)
+                    #for
+                    if partial:
+                        with open(head[1], "rb") as r:
+                            r.seek(head[4])
+                            f.write(r.read())
+                        #with
+                        count += head[2] - head[3]
+                    #if
+                #with
+                if partial:
+                    self._segments.popleft()
+                    if self._writer is not None and not self._segments:
+                        self._writer.close()
+                        self._writer = None
+                    #if
+                    self._unlink(head[1])
+                    self._spilled -= head[2] - head[3]
+                #if
+                self._segments.appendleft([number, path, count, 0, 0])
+                self._spilled += count
+                self._items.clear()
+            #if
+        #with
+    #persist
+
+
+    def _size(self) -> int:
+        return len(self._items) + self._spilled
+    #_size
+
+
+    def _enqueue(self, item) -> None:
+        if not self._spilled and len(self._items) < self._hotCapacity:
+            self._items.append(item)
+            return
+        #if
+        segment = self._segments[-1] if self._segments else None
+        if self._writer is None or segment[2] >= self._segmentSize:
+            if self._writer is not None:
+                self._writer.close()
+            #if
+            number = segment[0] + 1 if segment is not None else 0
+            segment = [number, self._segmentPath(number), 0, 0, 0]
+            self._segments.append(segment)
+            # unbuffered, so that spilled messages survive a crash
+            self._writer = open(segment[1], "ab", buffering = 0)
+        #if
+        self._write(self._writer, item)
+        segment[2] += 1
+        self._spilled += 1
+    #_enqueue
+
+
+    def _dequeue(self, maxItems: int) -> list:
+        if not self._items and self._spilled:
+            self._load()
+        #if
+        items = super()._dequeue(maxItems)
+        if not self._items and self._consumed is not None:
+            self._unlink(self._consumed)
+            self._consumed = None
+        #if
+        return items
+    #_dequeue
+
+
+    def _evictOldest(self) -> bool:
+        return False
+    #_evictOldest
+
+
+    def _load(self) -> None:
+        """
+        Moves up to 'hotCapacity' messages of the oldest segment file into
+        memory.
+        """
+        if self._consumed is not None:
+            self._unlink(self._consumed)
+            self._consumed = None
+        #if
+        segment = self._segments[0]
+        _, path, count, done, offset = segment
+        n = min(count - done, max(1, self._hotCapacity - len(self._items)))
+        loads = self._loads
+        size = self._LENGTH.size
+        with open(path, "rb") as f:
+            f.seek(offset)
+            for _ in range(n):
+                length, = self._LENGTH.unpack(f.read(size))
+                self._items.append(loads(f.read(length)))
+            #for
+            segment[4] = f.tell()
+        #with
+        segment[3] += n
+        self._spilled -= n
+        if segment[3] == count:
+            self._segments.popleft()
+            if self._writer is not None and not self._segments:
+                self._writer.close()
+                self._writer = None
+            #if
+            self._consumed = path
+        #if
+    #_load
+
+
+    def _write(self, f: typing.BinaryIO, item) -> None:
+        _discard(item)
+        data = self._dumps(_unwrap(item))
+        f.write(self._LENGTH.pack(len(data)) + data)
+    #_write
+
+
+    def _segmentPath(self, number: int) -> str:
+        return os.path.join(self._directory,
+                            "segment%d%s" % (number, self._SUFFIX))
+    #_segmentPath
+
+
+    def _segmentFiles(self) -> list[tuple[int, str]]:
+        """
+        :returns: (number, path) of the segment files in the directory.
+        """
+        files = []
+        for name in os.listdir(self._directory):
+            if name.startswith("segment") and name.endswith(self._SUFFIX):
+                try:
+                    number = int(name[len("segment"):-len(self._SUFFIX)])
+                except ValueError:
+                    continue
+                #except
+                files.append((number, os.path.join(self._directory, name)))
+            #if
+        #for
+        return files
+    #_segmentFiles
+
+
+    def _countRecords(self, path: str) -> int:
+        """
+        :returns: the number of complete records in a segment file.  An
+                  incomplete last record (left by a crash) is cut off.
+        """
+        count = 0
+        offset = 0
+        size = self._LENGTH.size
+        with open(path, "r+b") as f:
+            while True:
+                header = f.read(size)
+                if len(header) < size:
+                    break
+                #if
+                length, = self._LENGTH.unpack(header)
+                if len(f.read(length)) < length:
+                    break
+                #if
+                count += 1
+                offset += size + length
+            #while
+            f.truncate(offset)
+        #with
+        return count
+    #_countRecords
+
+
+    @staticmethod
+    def _unlink(path: str) -> None:
+        try:
+            os.unlink(path)
+        except OSError:
+            pass  # already removed
+        #except
+    #_unlink
+
+#SpillingMailbox
+
+
+class Thread:
+    """
+    Base class for an asynchronous component.
+    When start() is called, method threadCode()
+    is executed in a separate thread.
+
+    This class uses the module's logger.  Set the logging level and whether to
+    use colour with setLoggingOptions(level, colour={True|False}).
+    """
+
+    def __init__(self, name: str):
+        """
+        Constructor.
+
+        :param name: The thread's name.
+        """
+        super().__init__()
+        self._name = name
+        self._running = False
+        self._thread = None
+        self._lock = threading.Lock()
+    #__init__
+
+
+    def name(self) -> str:
+        """
+        :returns: the thread's name.
+        """
+        return self._name
+    #name
+
+
+    def threadCode(self) -> None:
+        """
+        DO override this method.  This is where the functionality that shall
+        run in a separate thread is to be implemented.
+        """
+        pass
+    #threadCode
+
+
+    def running(self) -> bool:
+        """
+        :returns: the current value of the running flag.
+        """
+        return self._running
+    #running
+
+
+    def start(self) -> None:
+        """
+        Starts the execution of threadCode(), sets the running flag to True,
+        and returns immediately.  threadCode() will continue to run in a
+        separate thread.
+
+        If threadCode() is already running, does nothing.
+        """
+        self._lock.acquire()
+        if self._running:
+            _logger.warning("thread '%s' already running", self._name)
+        else:
+            self._running = True
+            self._thread = threading.Thread(target = self._threadCode,
+                                            name = self._name,
+                                            daemon = True)
+            self._thread.start()
+        #else
+        self._lock.release()
+    #start
+
+
+    def stop(self) -> None:
+        """
+        Sets the running flag to False and waits for threadCode() to return.
+        It is your responsibility to implement code in threadCode() that
+        checks whether a stop has been requested.
+
+        Will block for ever if threadCode() doesn't return.  However, if
+        threadCode is NOT running (because not started or already finished),
+        returns immediately without blocking.
+        """
+        self._lock.acquire()
+        if self._running and self._thread is not None:
+            self._running = False
+            self._wakeUp()
+            self._thread.join()
+            self._thread = None
+        #if
+        self._lock.release()
+    #stop
+
+
+    def wait(self) -> None:
+        """
+        Waits for threadCode to return, but does not request a stop.
+
+        Will block for ever if threadCode() doesn't return.  However, if
+        threadCode is NOT running (because not started or already finished),
+        returns immediately without blocking.
+        """
+        self._lock.acquire()
+        if self._running and self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        #if
+        self._lock.release()
+    #wait
+
+
+    def _wakeUp(self) -> None:
+        """
+        Called by stop() after setting the running flag to False.  Override
+        this method to interrupt whatever threadCode() may be blocked on.
+        """
+        pass
+    #_wakeUp
+
+
+    def _stopWaiter(self, signal: bool) -> Callable[[float|None], bool]:
+        """
+        Requests a stop like stop() if 'signal' is True, but does not wait.
+        Used by ThreadGroup to stop many components at once.
+
+        :returns: a function that waits at most the given number of seconds
+                  (or for ever if None) for the component to stop, and returns
+                  True iff it has stopped.
+        """
+        with self._lock:
+            if not self._running or self._thread is None:
+                return lambda timeout: True
+            #if
+            if signal:
+                self._running = False
+                self._wakeUp()
+            #if
+            threads = [self._thread]
+        #with
+        return lambda timeout: _joinThreads(threads, timeout)
+    #_stopWaiter
+
+
+    def _threadCode(self):
+        try:
+            _logger.info("starting thread '%s'", self._name)
+            self.threadCode()
+            self._running = False
+            _logger.info("terminating thread '%s'", self._name)
+        except Exception as e:
+            _logger.error("exception in thread '%s': %s", self._name, e)
+            raise e
+        #except
+    #_threadCode
+
+#Thread
+
+
+class _LogHistogram:
+    """
+    Histogram of durations with power-of-two buckets in microseconds:
+    bucket 0 counts durations below 1 us, bucket k counts durations in
+    [2 ** (k - 1), 2 ** k) us.
+    """
+    __slots__ = ("count", "total", "max", "buckets")
+
+    _BUCKETS = 32
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.buckets = [0] * self._BUCKETS
+    #__init__
+
+
+    def record(self, seconds: float, count: int = 1) -> None:
+        """
+        Records 'count' durations of 'seconds' each.
+        """
+        self.count += count
+        self.total += seconds * count
+        if seconds > self.max:
+            self.max = seconds
+        #if
+        bucket = int(seconds * 1e6).bit_length()
+        self.buckets[min(bucket, self._BUCKETS - 1)] += count
+    #record
+
+
+    def asDict(self) -> dict:
+        """
+        :returns: count, mean and max (in seconds) and the non-empty buckets,
+                  keyed by their upper bound in microseconds.
+        """
+        return {
+            "count": self.count,
+            "mean": self.total / self.count if self.count else 0.0,
+            "max": self.max,
+            "histogram": { 2 ** k: n for k, n in enumerate(self.buckets) if n },
+        }
+    #asDict
+
+#_LogHistogram
+
+
+class ActorMetrics:
+    """
+    Runtime metrics of a reactive component, collected while metrics are
+    enabled with ReactiveThread.enableMetrics():
+
+    - queue depth (as seen by the message processing loop at each wakeup) and
+      its high-water mark;
+    - per message class: number of processed messages, throughput,
+      enqueue-to-dispatch latency and handler execution time (as histograms);
+    - per message class: number of messages without a processor.
+
+    Updates are serialised by a lock, so that pool workers may share one
+    instance.
+    """
+
+    def __init__(self, name: str):
+        """
+        Constructor.
+
+        :param name: The component's name.
+        """
+        self._name = name
+        self._lock = threading.Lock()
+        self._pending = threading.local() # see _observe()
+        self.reset()
+    #__init__
+
+
+    def reset(self) -> None:
+        """
+        Sets all metrics to zero and restarts the throughput clock.
+        """
+        with self._lock:
+            self._start = time.monotonic()
+            self._depth = 0
+            self._highWater = 0
+            self._latency = collections.defaultdict(_LogHistogram)
+            self._handlerTime = collections.defaultdict(_LogHistogram)
+            self._unknown = collections.Counter()
+        #with
+    #reset
+
+
+    def snapshot(self) -> dict:
+        """
+        :returns: the current metrics as a dictionary.  Times are in seconds.
+        """
+        with self._lock:
+            elapsed = time.monotonic() - self._start
+            types = dict()
+            for messageType, handlerTime in self._handlerTime.items():
+                types[messageType] = {
+                    "count": handlerTime.count,
+                    "throughput": handlerTime.count / elapsed if elapsed else 0.0,
+                    "handlerTime": handlerTime.asDict(),
+                }
+            #for
+            for messageType, latency in self._latency.items():
+                types.setdefault(messageType, dict())["latency"] \
+                    = latency.asDict()
+            #for
+            total = sum(h.count for h in self._handlerTime.values())
+            return {
+                "actor": self._name,
+                "elapsed": elapsed,
+                "queueDepth": self._depth,
+                "queueHighWater": self._highWater,
+                "messages": total,
+                "throughput": total / elapsed if elapsed else 0.0,
+                "unknown": dict(self._unknown),
+                "types": types,
+            }
+        #with
+    #snapshot
+
+
+    def _observe(self, messages: list, queued: int) -> list:
+        """
+        Records the queue depth for messages just taken from the mailbox, and
+        remembers their enqueue times, in order, for the calling thread.
+        The enqueue-to-dispatch latency of a message is recorded by the
+        wrapper returned by _timed(), just before its processor is called.
+
+        :param messages: The messages taken from the mailbox.
+
+        :param queued:   The number of messages still queued.
+
+        :returns: the messages, with envelopes that only carried a timestamp
+                  replaced by their message.
+        """
+        pending = collections.deque()
+        for i, item in enumerate(messages):
+            if type(item) is _Envelope:
+                pending.append((item.message, item.enqueued))
+                if item.enqueued is not None and item.future is None \
+                        and item.deadline is None and item.trace is None:
+                    messages[i] = item.message
+                #if
+            else:
+                pending.append((item, None))
+            #else
+        #for
+        self._pending.queue = pending
+        with self._lock:
+            self._depth = depth = queued + len(messages)
+            if depth > self._highWater:
+                self._highWater = depth
+            #if
+        #with
+        return messages
+    #_observe
+
+
+    def _timed(self, messageClass: type, processor: Callable, batch: bool):
+        """
+        :returns: a wrapper of 'processor' that records the enqueue-to-dispatch
+                  latency of its messages (see _observe()) and its execution
+                  time.
+        """
+        name = messageClass.__name__
+        local = self._pending
+        lock = self._lock
+        clock = time.perf_counter
+
+        def timedProcessor(message):
+            pending = getattr(local, "queue", None)
+            if pending:
+                now = time.monotonic()
+                latencies = []
+                for item in (message if batch else (message,)):
+                    # entries of messages that were not processed are skipped
+                    while pending:
+                        queued, enqueued = pending.popleft()
+                        if queued is item:
+                            if enqueued is not None:
+                                latencies.append(now - enqueued)
+                            #if
+                            break
+                        #if
+                    #while
+                #for
+                if latencies:
+                    with lock:
+                        histogram = self._latency[name] # reset() replaces it
+                        for value in latencies:
+                            histogram.record(value)
+                        #for
+                    #with
+                #if
+            #if
+            start = clock()
+            try:
+                return processor(message)
+            finally:
+                elapsed = clock() - start
+                with lock:
+                    histogram = self._handlerTime[name]
+                    if batch:
+                        histogram.record(elapsed / len(message), len(message))
+                    else:
+                        histogram.record(elapsed)
+                    #else
+                #with
+            #finally
+        #timedProcessor
+
+        return timedProcessor
+    #_timed
+
+
+    def _recordUnknown(self, messageClass: type) -> None:
+        with self._lock:
+            self._unknown[messageClass.__name__] += 1
+        #with
+    #_recordUnknown
+
+#ActorMetrics
+
+
+class MetricsReporter(Thread):
+    """
+    Asynchronous component that periodically takes metrics snapshots of a
+    set of reactive components and reports them.
+    """
+
+    def __init__(self,
+                 name: str,
+                 actors: list,
+                 interval: float,
+                 report: Callable[[list[dict]], None]|None = None,
+                 reset: bool = False):
+        """
+        Constructor.
+
+        :param name:     The reporter's name.
+
+        :param actors:   The components to report on.  Components whose
+                         metrics are not enabled are skipped.
+
+        :param interval: Time in seconds between reports.
+
+        :param report:   A function that receives the list of snapshots.
+                         If None, each snapshot is logged at INFO level.
+
+        :param reset:    If True, each component's metrics are reset after
+                         each report, so that each report covers one interval.
+        """
+        super().__init__(name)
+        self._actors = actors
+        self._interval = interval
+        self._report = report if report is not None else self._logReport
+        self._reset = reset
+        self._stopEvent = threading.Event()
+    #__init__
+
+
+    def threadCode(self) -> None:
+        self._stopEvent.clear()
+        while self._running:
+            if self._stopEvent.wait(self._interval):
+                break
+            #if
+            snapshots = []
+            for actor in self._actors:
+                metrics = actor.metrics()
+                if metrics is not None:
+                    snapshots.append(metrics.snapshot())
+                    if self._reset:
+                        metrics.reset()
+                    #if
+                #if
+            #for
+            self._report(snapshots)
+        #while
+    #threadCode
+
+
+    def _wakeUp(self) -> None:
+        self._stopEvent.set()
+    #_wakeUp
+
+
+    @staticmethod
+    def _logReport(snapshots: list[dict]) -> None:
+        for snapshot in snapshots:
+            _logger.info("metrics: %s", snapshot)
+        #for
+    #_logReport
+
+#MetricsReporter
+
+
+class Watchdog(Thread):
+    """
+    Asynchronous component that detects message processors that run longer
+    than their budget in a set of reactive components, e.g. because they are
+    blocked on a lock or a subprocess.  For each overrun, it captures the
+    stack of the stuck thread and reports it together with the message type,
+    the component's queue depth and the elapsed time.
+
+    Watching a component makes each processor call record its start time;
+    unwatched components are not affected.  Each overrunning call is
+    reported once.  Works for ReactiveThread, ReactiveThreadPool and
+    components run by an ActorExecutor, but not for ReactiveProcess, whose
+    processors run in a child process, nor for AsyncReactiveActor, whose
+    processors may return before their work is done.
+    """
+
+    def __init__(self,
+                 name: str = "watchdog",
+                 interval: float = 0.1,
+                 budgets: dict|None = None,
+                 defaultBudget: float = 1.0,
+                 report: Callable[[dict], None]|None = None):
+        """
+        Constructor.
+
+        :param name:          The watchdog's name.
+
+        :param interval:      Time in seconds between checks.
+
+        :param budgets:       Maximum processing time in seconds per message
+                              class (or class name); a class without an entry
+                              uses the entry of its nearest base class.
+
+        :param defaultBudget: Maximum processing time in seconds for message
+                              classes without a budget.
+
+        :param report:        A function that receives each overrun as a
+                              dictionary with the keys 'actor', 'messageType',
+                              'elapsed', 'budget', 'queueDepth', 'thread' and
+                              'stack'.  If None, overruns are logged at WARNING
+                              level.
+        """
+        super().__init__(name)
+        self._interval = interval
+        self._budgets = dict() if budgets is None else dict(budgets)
+        self._defaultBudget = defaultBudget
+        self._report = report if report is not None else self._logReport
+        self._actors = []
+        self._budgetCache = dict()
+        self._reported = set()
+        self._overruns = 0
+        self._stopEvent = threading.Event()
+    #__init__
+
+
+    def watch(self, actor: "ReactiveThread") -> None:
+        """
+        Starts watching a component.  May be called while it is running.
+
+        :param actor: A ReactiveThread or ReactiveThreadPool.
+
+        :raises TypeError: if actor is not a ReactiveThread.
+        """
+        if not isinstance(actor, ReactiveThread):
+            raise TypeError("cannot watch objects of type %s"
+                            % type(actor).__name__)
+        #if
+        if actor._handlerStarts is None:
+            actor._handlerStarts = dict()
+            actor._dispatchCache.clear()
+        #if
+        self._actors = self._actors + [actor]
+    #watch
+
+
+    def unwatch(self, actor: "ReactiveThread") -> None:
+        """
+        Stops watching a component.
+
+        :param actor: A component passed to watch().
+        """
+        self._actors = [ a for a in self._actors if a is not actor ]
+        actor._handlerStarts = None
+        actor._dispatchCache.clear()
+    #unwatch
+
+
+    def overrunCount(self) -> int:
+        """
+        :returns: the number of overruns reported.
+        """
+        return self._overruns
+    #overrunCount
+
+
+    def check(self) -> list[dict]:
+        """
+        Checks all watched components once and reports new overruns.  Called
+        periodically by the running watchdog.
+
+        :returns: the new overruns.
+        """
+        now = time.monotonic()
+        frames = None
+        overruns = []
+        stillRunning = set()
+        for actor in self._actors:
+            starts = actor._handlerStarts
+            if starts is None:
+                continue
+            #if
+            for threadId, (messageClass, start) in list(starts.items()):
+                budget = self._budget(messageClass)
+                elapsed = now - start
+                if elapsed <= budget:
+                    continue
+                #if
+                key = (threadId, start)
+                stillRunning.add(key)
+                if key in self._reported:
+                    continue
+                #if
+                if frames is None:
+                    frames = sys._current_frames()
+                #if
+                frame = frames.get(threadId)
+                overruns.append({
+                    "actor": actor.name(),
+                    "messageType": messageClass.__name__,
+                    "elapsed": elapsed,
+                    "budget": budget,
+                    "queueDepth": actor.mailbox().qsize(),
+                    "thread": threadId,
+                    "stack": "" if frame is None
+                             else "".join(traceback.format_stack(frame)),
+                })
+            #for
+        #for
+        self._reported = stillRunning
+        self._overruns += len(overruns)
+        for overrun in overruns:
+            self._report(overrun)
+        #for
+        return overruns
+    #check
+
+
+    def threadCode(self) -> None:
+        self._stopEvent.clear()
+        while self._running:
+            if self._stopEvent.wait(self._interval):
+                break
+            #if
+            self.check()
+        #while
+    #threadCode
+
+
+    def _wakeUp(self) -> None:
+        self._stopEvent.set()
+    #_wakeUp
+
+
+    def _budget(self, messageClass: type) -> float:
+        try:
+            return self._budgetCache[messageClass]
+        except KeyError:
+            pass
+        #except
+        budget = self._defaultBudget
+        for klass in messageClass.__mro__:
+            if klass in self._budgets:
+                budget = self._budgets[klass]
+                break
+            #if
+            if klass.__name__ in self._budgets:
+                budget = self._budgets[klass.__name__]
+                break
+            #if
+        #for
+        self._budgetCache[messageClass] = budget
+        return budget
+    #_budget
+
+
+    @staticmethod
+    def _logReport(overrun: dict) -> None:
+        _logger.warning("%s: processing of %s has taken %.3f s (budget %.3f s),"
+                        " %d messages queued; stack:\n%s",
+                        overrun["actor"], overrun["messageType"],
+                        overrun["elapsed"], overrun["budget"],
+                        overrun["queueDepth"], overrun["stack"])
+    #_logReport
+
+#Watchdog
+
+
+def _watched(starts: dict, messageClass: type, processor: Callable):
+    """
+    :returns: a wrapper of 'processor' that records, per thread, the class of
+              the message being processed and the time processing started.
+    """
+    clock = time.monotonic
+    getIdent = threading.get_ident
+
+    def watchedProcessor(message):
+        ident = getIdent()
+        starts[ident] = (messageClass, clock())
+        try:
+            return processor(message)
+        finally:
+            starts.pop(ident, None)
+        #finally
+    #watchedProcessor
+
+    return watchedProcessor
+#_watched
+
+
+class TraceRecorder:
+    """
+    Records the messages sent to reactive components, with timing, to a
+    binary trace file; see ReactiveThread.recordTrace().  The trace can be
+    read with read() and replayed with replayTrace().
+
+    Each message is recorded when it is queued up (time and pickled message)
+    and when its processor returns (start and end of processing).  Times are
+    in seconds since the recorder was created.  Messages that cannot be
+    pickled are counted and sent unrecorded.
+    """
+
+    _MAGIC = b"CZTRACE1"
+    _RECORD = struct.Struct("<cQddI") # kind, sequence number, time, time, size
+    _COMM = b"C"
+    _DISPATCH = b"D"
+
+    def __init__(self, file: str|typing.BinaryIO):
+        """
+        Constructor.
+
+        :param file: A file name or a binary file object open for writing.
+                     A file opened by the recorder is closed by close().
+        """
+        if isinstance(file, str):
+            self._file = open(file, "wb")
+            self._ownFile = True
+        else:
+            self._file = file
+            self._ownFile = False
+        #else
+        self._file.write(self._MAGIC)
+        self._lock = threading.Lock()
+        self._start = time.perf_counter()
+        self._sequence = 0
+        self._skipped = 0
+        self._closed = False
+    #__init__
+
+
+    def recorded(self) -> int:
+        """
+        :returns: the number of messages recorded so far.
+        """
+        return self._sequence
+    #recorded
+
+
+    def skipped(self) -> int:
+        """
+        :returns: the number of messages not recorded because they could not
+                  be pickled.
+        """
+        return self._skipped
+    #skipped
+
+
+    def close(self) -> None:
+        """
+        Stops recording and flushes the trace.  Messages that are processed
+        later are not recorded.
+        """
+        with self._lock:
+            if self._closed:
+                return
+            #if
+            self._closed = True
+            if self._ownFile:
+                self._file.close()
+            else:
+                self._file.flush()
+            #else
+        #with
+    #close
+
+
+    @classmethod
+    def read(cls, file: str|typing.BinaryIO) -> list[tuple]:
+        """
+        Reads a trace.
+
+        :param file: A file name or a binary file object open for reading.
+
+        :returns: a list of tuples (sent, message, start, end), one per
+                  recorded message, in the order the messages were queued up.
+                  start and end are None if the message was not processed
+                  while recording.
+
+        :raises ValueError: if the file is not a trace.
+        """
+        if isinstance(file, str):
+            with open(file, "rb") as f:
+                return cls.read(f)
+            #with
+        #if
+        if file.read(len(cls._MAGIC)) != cls._MAGIC:
+            raise ValueError("not a message trace")
+        #if
+        record = cls._RECORD
+        entries = dict()
+        while True:
+            header = file.read(record.size)
+            if len(header) < record.size:
+                break
+            #if
+            kind, sequence, time1, time2, size = record.unpack(header)
+            if kind == cls._COMM:
+                entries[sequence] = [time1, pickle.loads(file.read(size)),
+                                     None, None]
+            elif sequence in entries:
+                entries[sequence][2:] = time1, time2
+            #elif
+        #while
+        return [ tuple(entries[sequence]) for sequence in sorted(entries) ]
+    #read
+
+
+    def _recordComm(self, envelope: _Envelope) -> None:
+        """
+        Records a message that is being queued up and marks its envelope for
+        recording of its processing.
+        """
+        try:
+            payload = _pickleByValue(envelope.message)
+        except Exception as e:
+            _logger.warning("cannot record message of type %s: %s",
+                            type(envelope.message).__name__, e)
+            self._skipped += 1
+            return
+        #except
+        now = time.perf_counter() - self._start
+        with self._lock:
+            if self._closed:
+                return
+            #if
+            sequence = self._sequence
+            self._sequence += 1
+            self._file.write(self._RECORD.pack(self._COMM, sequence, now, 0.0,
+                                               len(payload)))
+            self._file.write(payload)
+        #with
+        envelope.trace = (self, sequence)
+    #_recordComm
+
+
+    def _recordDispatch(self, sequence: int, start: float, end: float) -> None:
+        """
+        Records the processing of a message.  Times are perf_counter() values.
+        """
+        with self._lock:
+            if not self._closed:
+                self._file.write(self._RECORD.pack(self._DISPATCH, sequence,
+                                                   start - self._start,
+                                                   end - self._start, 0))
+            #if
+        #with
+    #_recordDispatch
+
+#TraceRecorder
+
+
+def replayTrace(trace: str|typing.BinaryIO|list[tuple],
+                actor,
+                speed: float|None = 1.0) -> dict:
+    """
+    Replays a recorded trace against a reactive component and compares
+    throughput and latency with the recording.
+
+    The component is started, receives the recorded messages in order, and
+    is sent a QuitMessage at the end unless the trace contains one; then
+    replayTrace() waits for it to finish.
+
+    :param trace: A trace file name or binary file object, or entries as
+                  returned by TraceRecorder.read().
+
+    :param actor: A ReactiveThread (or derived class) that is not running.
+
+    :param speed: Replay speed relative to the recording: 1.0 reproduces the
+                  recorded message timing, 2.0 sends messages twice as fast.
+                  If None, messages are sent as fast as possible.
+
+    :returns: a dictionary with the keys 'recorded' and 'replayed' (summaries
+              of the recording and of the replay, see below),
+              'throughputRatio' (replayed throughput / recorded throughput)
+              and 'latencyRatio' (replayed / recorded latency, per
+              statistic).  A summary contains the number of processed
+              messages ('messages'), the time from the first message sent to
+              the last one processed ('elapsed'), 'throughput', and
+              queue-to-completion 'latency' and 'handlerTime' statistics
+              ('mean', 'p50', 'p99', 'max'), in seconds.
+    """
+    if not isinstance(trace, list):
+        trace = TraceRecorder.read(trace)
+    #if
+    buffer = io.BytesIO()
+    recorder = TraceRecorder(buffer)
+    actor.recordTrace(recorder)
+    try:
+        actor.start()
+        clock = time.perf_counter
+        origin = clock()
+        first = trace[0][0] if trace else 0.0
+        quit = False
+        for sent, message, _, _ in trace:
+            if speed is not None:
+                delay = (sent - first) / speed - (clock() - origin)
+                if delay > 0:
+                    time.sleep(delay)
+                #if
+            #if
+            actor.comm(message)
+            if isinstance(message, QuitMessage):
+                quit = True
+                break
+            #if
+        #for
+        if not quit:
+            actor.comm(QuitMessage())
+        #if
+        actor.wait()
+    finally:
+        actor.recordTrace(None)
+        recorder.close()
+    #finally
+    buffer.seek(0)
+    recorded = _traceSummary(trace)
+    replayed = _traceSummary(TraceRecorder.read(buffer))
+    return {
+        "recorded": recorded,
+        "replayed": replayed,
+        "throughputRatio": replayed["throughput"] / recorded["throughput"]
+                           if recorded["throughput"] else None,
+        "latencyRatio": {
+            key: replayed["latency"][key] / recorded["latency"][key]
+                 if recorded["latency"][key] else None
+            for key in recorded["latency"] },
+    }
+#replayTrace
+
+
+def _traceSummary(trace: list[tuple]) -> dict:
+    """
+    :returns: throughput and latency statistics of trace entries.
+    """
+    processed = [ entry for entry in trace if entry[3] is not None ]
+
+    def statistics(values: list[float]) -> dict:
+        values.sort()
+        n = len(values)
+        return {
+            "mean": sum(values) / n if n else 0.0,
+            "p50": values[(n - 1) // 2] if n else 0.0,
+            "p99": values[int(0.99 * (n - 1))] if n else 0.0,
+            "max": values[-1] if n else 0.0,
+        }
+    #statistics
+
+    elapsed = max(entry[3] for entry in processed) \
+        - min(entry[0] for entry in processed) if processed else 0.0
+    return {
+        "messages": len(processed),
+        "elapsed": elapsed,
+        "throughput": len(processed) / elapsed if elapsed else 0.0,
+        "latency": statistics([ end - sent
+                                for sent, _, _, end in processed ]),
+        "handlerTime": statistics([ end - start
+                                    for _, _, start, end in processed ]),
+    }
+#_traceSummary
+
+
+class TimerHandle:
+    """
+    A pending timer created by Scheduler.commAfter() or commEvery().
+    """
+    __slots__ = ("_scheduler", "actor", "message", "deadline", "period",
+                 "cancelled")
+
+    def __init__(self, scheduler, actor, message: Message, deadline: float,
+                 period: float|None):
+        self._scheduler = scheduler
+        self.actor = actor
+        self.message = message
+        self.deadline = deadline
+        self.period = period
+        self.cancelled = False
+    #__init__
+
+
+    def cancel(self) -> None:
+        """
+        Cancels the timer.  Does nothing if it has already fired (one-shot
+        timers) or been cancelled.
+        """
+        scheduler = self._scheduler
+        if scheduler is not None:
+            scheduler.cancel(self)
+        #if
+    #cancel
+
+#TimerHandle
+
+
+class _TimerQueue:
+    """
+    Binary heap of timers.  Adding a timer is O(log n), cancelling it is O(1):
+    cancelled timers are discarded lazily, and the heap is compacted when
+    more than half of it is cancelled timers.  Not thread-safe.
+    """
+
+    def __init__(self):
+        self._heap = []
+        self._sequence = itertools.count()
+        self._cancelled = 0
+    #__init__
+
+
+    def __len__(self) -> int:
+        return len(self._heap) - self._cancelled
+    #__len__
+
+
+    def nextDeadline(self) -> float|None:
+        """
+        :returns: the earliest deadline in the heap (possibly of a cancelled
+                  timer), or None if the heap is empty.
+        """
+        return self._heap[0][0] if self._heap else None
+    #nextDeadline
+
+
+    def push(self, handle: "TimerHandle") -> bool:
+        """
+        :returns: True iff the timer is now the earliest one.
+        """
+        heapq.heappush(self._heap,
+                       (handle.deadline, next(self._sequence), handle))
+        return self._heap[0][2] is handle
+    #push
+
+
+    def cancel(self, handle: "TimerHandle") -> None:
+        if handle.cancelled:
+            return
+        #if
+        handle.cancelled = True
+        self._cancelled += 1
+        if self._cancelled > len(self._heap) // 2:
+            self._heap = [ entry for entry in self._heap
+                           if not entry[2].cancelled ]
+            heapq.heapify(self._heap)
+            self._cancelled = 0
+        #if
+    #cancel
+
+
+    def popDue(self, now: float) -> list:
+        """
+        Removes the timers that are due at time 'now' and re-inserts periodic
+        ones with their next deadline.  If more than a period has been missed,
+        the missed deadlines are skipped.
+
+        :returns: the due timers, earliest first.
+        """
+        heap = self._heap
+        due = []
+        while heap and heap[0][0] <= now:
+            deadline, _, handle = heapq.heappop(heap)
+            if handle.cancelled:
+                self._cancelled -= 1
+                continue
+            #if
+            due.append(handle)
+            if handle.period is None:
+                handle._scheduler = None
+            else:
+                deadline += handle.period
+                if deadline <= now:
+                    deadline = now + handle.period
+                #if
+                handle.deadline = deadline
+                heapq.heappush(heap, (deadline, next(self._sequence), handle))
+            #else
+        #while
+        return due
+    #popDue
+
+#_TimerQueue
+
+
+class Scheduler(Thread):
+    """
+    Asynchronous component that sends messages to reactive components after a
+    delay or periodically, using one thread for all timers.
+
+    Timers are kept in a binary heap: creating a timer is O(log n),
+    cancelling it is O(1) (cancelled timers are discarded lazily, and the
+    heap is compacted when more than half of it is cancelled timers).
+
+    Timers can be created before the scheduler is started; they fire once it
+    runs.
+    """
+
+    def __init__(self, name: str = "scheduler"):
+        """
+        Constructor.
+
+        :param name: The scheduler's name.
+        """
+        super().__init__(name)
+        self._timers = _TimerQueue()
+        self._condition = threading.Condition(threading.Lock())
+    #__init__
+
+
+    def pending(self) -> int:
+        """
+        :returns: the number of pending (not cancelled) timers.
+        """
+        with self._condition:
+            return len(self._timers)
+        #with
+    #pending
+
+
+    def now(self) -> float:
+        """
+        :returns: the scheduler's clock, i.e. time.monotonic().
+        """
+        return time.monotonic()
+    #now
+
+
+    def commAfter(self, actor, message: Message, delay: float) -> TimerHandle:
+        """
+        Sends a message to a component once, after a delay.
+
+        :param actor:   Any object with a comm() method, e.g. a ReactiveThread.
+
+        :param message: The message to send.
+
+        :param delay:   Delay in seconds.
+
+        :returns: a handle to cancel the timer.
+        """
+        return self._add(actor, message, delay, None)
+    #commAfter
+
+
+    def commEvery(self,
+                  actor,
+                  message: Message,
+                  period: float,
+                  delay: float|None = None) -> TimerHandle:
+        """
+        Sends a message to a component periodically, until the timer is
+        cancelled.  The same message object is sent each time.  If the
+        scheduler falls behind by more than a period, the missed sends are
+        skipped.
+
+        :param actor:   Any object with a comm() method, e.g. a ReactiveThread.
+
+        :param message: The message to send.
+
+        :param period:  Period in seconds.  Must be > 0.
+
+        :param delay:   Delay in seconds before the first send.  If None,
+                        equal to 'period'.
+
+        :returns: a handle to cancel the timer.
+        """
+        if period <= 0:
+            raise ValueError("'period' must be > 0")
+        #if
+        return self._add(actor, message,
+                         period if delay is None else delay, period)
+    #commEvery
+
+
+    def cancel(self, handle: TimerHandle) -> None:
+        """
+        Cancels a timer.  Does nothing if it has already fired (one-shot
+        timers) or been cancelled.
+
+        :param handle: A handle returned by commAfter() or commEvery().
+        """
+        with self._condition:
+            if handle._scheduler is self:
+                self._timers.cancel(handle)
+            #if
+        #with
+    #cancel
+
+
+    def threadCode(self) -> None:
+        while self._running:
+            with self._condition:
+                now = time.monotonic()
+                due = self._timers.popDue(now)
+                if not due:
+                    if self._running:
+                        deadline = self._timers.nextDeadline()
+                        self._condition.wait(
+                            None if deadline is None else deadline - now)
+                    #if
+                    continue
+                #if
+            #with
+            for handle in due:
+                try:
+                    handle.actor.comm(handle.message)
+                except Exception as e:
+                    _logger.error("%s: cannot send timer message: %s",
+                                  self._name, e)
+                #except
+            #for
+        #while
+    #threadCode
+
+
+    def _add(self, actor, message: Message, delay: float,
+             period: float|None) -> TimerHandle:
+        handle = TimerHandle(self, actor, message, self.now() + delay, period)
+        with self._condition:
+            if self._timers.push(handle):
+                self._condition.notify()
+            #if
+        #with
+        return handle
+    #_add
+
+
+    def _wakeUp(self) -> None:
+        with self._condition:
+            self._condition.notify()
+        #with
+    #_wakeUp
+
+#Scheduler
+
+
+class Subscription:
+    """
+    A subscription created by MessageBus.subscribe().
+    """
+    __slots__ = ("_bus", "actor", "topic", "filter")
+
+    def __init__(self, bus, actor, topic: str|type[Message],
+                 filter: Callable[[Message], bool]|None):
+        self._bus = bus
+        self.actor = actor
+        self.topic = topic
+        self.filter = filter
+    #__init__
+
+
+    def cancel(self) -> None:
+        """
+        Removes the subscription from its bus.
+        """
+        self._bus.unsubscribe(self)
+    #cancel
+
+#Subscription
+
+
+class MessageBus:
+    """
+    Publish/subscribe hub that fans messages out to reactive components.
+
+    Components subscribe to topics or to message classes:
+
+    - Topics are strings of dot-separated words.  Subscription patterns may
+      use '*' for exactly one word and '#' for zero or more words, e.g.
+      'orders.*.created' or 'orders.#'.
+    - A class subscription receives all published messages that are instances
+      of the class (or of a derived class), whatever their topic.
+
+    publish() costs O(matching subscribers) and takes no lock: the
+    subscriptions are replaced (copy-on-write) on each subscribe() or
+    unsubscribe(), and the subscribers matching a (topic, class) pair are
+    computed once and cached.  A subscription's filter runs in the
+    publishing thread before the message is queued up, so filtered messages
+    never reach the subscriber's mailbox.
+
+    The same message object is delivered to all subscribers, so subscribers
+    must not modify it.
+    """
+
+    _CACHE_SIZE = 4096
+
+    def __init__(self):
+        """
+        Constructor.
+        """
+        self._lock = threading.Lock()
+        self._state = ((), dict())
+    #__init__
+
+
+    def subscribe(self,
+                  actor,
+                  topic: str|type[Message],
+                  filter: Callable[[Message], bool]|None = None
+                  ) -> Subscription:
+        """
+        Subscribes a component to a topic pattern or a message class.
+
+        :param actor:  Any object with a comm() method, e.g. a ReactiveThread.
+
+        :param topic:  A topic pattern or a class derived from Message.
+
+        :param filter: A predicate.  If given, only messages for which it
+                       returns True are delivered.
+
+        :returns: the subscription, which can be cancelled.
+        """
+        subscription = Subscription(self, actor, topic, filter)
+        with self._lock:
+            subscriptions, _ = self._state
+            self._state = (subscriptions + (subscription,), dict())
+        #with
+        return subscription
+    #subscribe
+
+
+    def unsubscribe(self, subscription: Subscription) -> None:
+        """
+        Cancels a subscription.  Does nothing if it has already been
+        cancelled.
+        """
+        with self._lock:
+            subscriptions, _ = self._state
+            self._state = (tuple(s for s in subscriptions
+                                 if s is not subscription),
+                           dict())
+        #with
+    #unsubscribe
+
+
+    def publish(self, message: Message, topic: str|None = None) -> int:
+        """
+        Delivers a message to all matching subscribers with their comm().
+
+        :param message: The message to publish.
+
+        :param topic:   The message's topic, or None to reach class
+                        subscriptions only.
+
+        :returns: the number of subscribers the message was delivered to.
+        """
+        subscriptions, cache = self._state
+        key = (topic, type(message))
+        try:
+            matching = cache[key]
+        except KeyError:
+            matching = tuple(s for s in subscriptions
+                             if _subscriptionMatches(s, key))
+            if len(cache) < self._CACHE_SIZE:
+                cache[key] = matching
+            #if
+        #except
+        delivered = 0
+        for subscription in matching:
+            if subscription.filter is None or subscription.filter(message):
+                subscription.actor.comm(message)
+                delivered += 1
+            #if
+        #for
+        return delivered
+    #publish
+
+#MessageBus
+
+
+def _subscriptionMatches(subscription: Subscription, key: tuple) -> bool:
+    topic, messageClass = key
+    if isinstance(subscription.topic, str):
+        return topic is not None \
+            and _topicMatches(subscription.topic.split("."), topic.split("."))
+    #if
+    return issubclass(messageClass, subscription.topic)
+#_subscriptionMatches
+
+
+def _topicMatches(pattern: list[str], words: list[str]) -> bool:
+    """
+    :returns: True iff the topic given by 'words' matches the pattern.
+    """
+    if not pattern:
+        return not words
+    #if
+    head = pattern[0]
+    if head == "#":
+        return any(_topicMatches(pattern[1:], words[i:])
+                   for i in range(len(words) + 1))
+    #if
+    if not words:
+        return False
+    #if
+    return (head == "*" or head == words[0]) \
+        and _topicMatches(pattern[1:], words[1:])
+#_topicMatches
+
+
+class _MessageDispatcher:
+    """
+    Registration and lookup of message processors, shared by the reactive
+    component classes.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self._messageProcessor = dict()
+        self._batchMessageProcessor = dict()
+        self._dispatchCache = dict()
+        self._metrics = None
+        self._handlerStarts = None
+        self._deadLetter = None
+        self._expired = 0
+        self._expiredLock = threading.Lock()
+        for attrName, (messageTypes, batch) in self._czDecoratedProcessors:
+            method = getattr(self, attrName)
+            for messageType in messageTypes:
+                if batch:
+                    self.addBatchMessageProcessor(messageType, method)
+                else:
+                    self.addMessageProcessor(messageType, method)
+                #else
+            #for
+        #for
+    #__init__
+
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        decorated = dict()
+        for klass in reversed(cls.__mro__):
+            for attrName, attr in vars(klass).items():
+                if hasattr(attr, "_czMessageTypes"):
+                    decorated[attrName] = attr._czMessageTypes
+                #if
+            #for
+        #for
+        cls._czDecoratedProcessors = tuple(decorated.items())
+    #__init_subclass__
+
+
+    def addMessageProcessor(self,
+                            messageType: type[Message]|str,
+                            method: Callable[[Message], None]) -> None:
+        """
+        Register a message processor, i.e. a method that will be used to process
+        messages of a particular class.
+
+        Use this method only within __init__.
+
+        :param messageType: The message's class, or its class name.
+
+        :param method:      A method that takes a message of the class in
+                            question and returns None.  May be a static
+                            function.
+        """
+        self._messageProcessor[messageType] = method
+        self._dispatchCache.clear()
+    #addMessageProcessor
+
+
+    def addBatchMessageProcessor(self,
+                                 messageType: type[Message]|str,
+                                 method: Callable[[list[Message]], None]
+                                 ) -> None:
+        """
+        Register a batch message processor, i.e. a method that will be used to
+        process runs of consecutive messages of a particular class.
+        Takes precedence over a processor registered with addMessageProcessor
+        for the same class.
+
+        Use this method only within __init__.
+
+        :param messageType: The message's class, or its class name.
+
+        :param method:      A method that takes a non-empty list of messages
+                            of the class in question (oldest first) and returns
+                            None.  May be a static function.
+        """
+        self._batchMessageProcessor[messageType] = method
+        self._dispatchCache.clear()
+    #addBatchMessageProcessor
+
+
+    def setDeadLetterHandler(self,
+                             handler: Callable[[Message], None]|None) -> None:
+        """
+        Sets the function that receives messages that expire before they are
+        processed (see comm()), e.g. to log them or to send them elsewhere.
+        It is called by the thread that would have processed the message.
+
+        :param handler: A function that takes a message, or None.
+        """
+        self._deadLetter = handler
+    #setDeadLetterHandler
+
+
+    def expiredCount(self) -> int:
+        """
+        :returns: the number of messages discarded because they expired.
+        """
+        return self._expired
+    #expiredCount
+
+
+    def _countExpired(self) -> None:
+        with self._expiredLock:
+            self._expired += 1
+        #with
+    #_countExpired
+
+
+    def _resolve(self, messageClass: type) -> tuple:
+        """
+        :returns: (kind, processor) for messages of the given class, where
+                  kind is one of _QUIT, _UNKNOWN, _SINGLE and _BATCH.
+                  If metrics are enabled, processor records its execution
+                  time; if a Watchdog watches the component, its start time.
+        """
+        kind, processor = self._findProcessor(messageClass)
+        if self._metrics is not None and processor is not None:
+            processor = self._metrics._timed(messageClass, processor,
+                                             kind == _BATCH)
+        #if
+        if self._handlerStarts is not None and processor is not None:
+            processor = _watched(self._handlerStarts, messageClass, processor)
+        #if
+        return kind, processor
+    #_resolve
+
+
+    def _findProcessor(self, messageClass: type) -> tuple:
+        """
+        :returns: (kind, processor) for messages of the given class, as
+                  registered.
+        """
+        if issubclass(messageClass, QuitMessage):
+            return _QUIT, None
+        #if
+        for klass in messageClass.__mro__:
+            for key in (klass, klass.__name__):
+                if key in self._batchMessageProcessor:
+                    return _BATCH, self._batchMessageProcessor[key]
+                #if
+                if key in self._messageProcessor:
+                    return _SINGLE, self._messageProcessor[key]
+                #if
+            #for
+        #for
+        return _UNKNOWN, None
+    #_findProcessor
+
+
+    def _unknownMessage(self, messageClass: type) -> None:
+        _logger.warning("%s: don't know what to do with messages of type %s",
+                        self._name, messageClass.__name__)
+        if self._metrics is not None:
+            self._metrics._recordUnknown(messageClass)
+        #if
+    #_unknownMessage
+
+
+    def _openEnvelope(self, envelope: _Envelope) -> tuple:
+        """
+        Looks up the processor for the message in an envelope and settles the
+        envelope's future if the message is not to be processed.
+
+        :returns: (kind, processor) as for _resolve(); processor is None if the
+                  message must not be processed.
+        """
+        message = envelope.message
+        future = envelope.future
+        messageClass = type(message)
+        try:
+            kind, processor = self._dispatchCache[messageClass]
+        except KeyError:
+            kind, processor = self._dispatchCache[messageClass] \
+                = self._resolve(messageClass)
+        #except
+        if future is not None and not future.set_running_or_notify_cancel():
+            return kind, None
+        #if
+        if envelope.deadline is not None \
+                and time.monotonic() > envelope.deadline:
+            if future is not None:
+                future.set_exception(TimeoutError(
+                    "message of type %s expired" % messageClass.__name__))
+            #if
+            self._countExpired()
+            if self._deadLetter is not None:
+                self._deadLetter(message)
+            #if
+            return _UNKNOWN, None
+        #if
+        if kind == _QUIT or kind == _UNKNOWN:
+            if kind == _UNKNOWN:
+                self._unknownMessage(messageClass)
+            #if
+            if future is not None:
+                if kind == _QUIT:
+                    future.set_result(None)
+                else:
+                    future.set_exception(UnknownMessageError(
+                        messageClass.__name__))
+                #else
+            #if
+            return kind, None
+        #if
+        return kind, processor
+    #_openEnvelope
+
+
+    def _callEnveloped(self,
+                       processor: Callable,
+                       argument,
+                       envelope: _Envelope) -> None:
+        """
+        Calls the processor for the message in an envelope and settles the
+        envelope's future.
+        """
+        start = None if envelope.trace is None else time.perf_counter()
+        try:
+            result = processor(argument)
+        except Exception as e:
+            self._settle(envelope, None, e, start)
+        else:
+            self._settle(envelope, result, None, start)
+        #else
+    #_callEnveloped
+
+
+    def _settle(self,
+                envelope: _Envelope,
+                result,
+                error: Exception|None,
+                start: float|None) -> None:
+        """
+        Settles the future of an envelope whose message has been processed,
+        and records the processing if the envelope is being traced.
+
+        :raises Exception: error, if the envelope has no future.
+        """
+        future = envelope.future
+        if error is not None:
+            if future is None:
+                raise error
+            #if
+            future.set_exception(error)
+        elif future is not None:
+            future.set_result(result)
+        #elif
+        if start is not None:
+            trace = envelope.trace
+            trace[0]._recordDispatch(trace[1], start, time.perf_counter())
+        #if
+    #_settle
+
+#_MessageDispatcher
+
+
+class _AskingDispatcher(_MessageDispatcher):
+    """
+    A _MessageDispatcher whose messages can be asked for a reply, i.e. that
+    settles futures in the process that sent the message.
+    """
+
+    def ask(self,
+            message: Message,
+            timeout: float|None = None) -> concurrent.futures.Future:
+        """
+        Queues up a message like comm() and returns a future for the reply.
+        The future's result is the value returned by the message processor.
+        If the processor raises an exception, the future's exception is set
+        instead of the component's loop being aborted.
+
+        A batch message processor receives asked messages one at a time, as a
+        list of length 1.
+
+        :param message: An instance of a class derived from Message.
+
+        :param timeout: If the message is still queued after this many
+                        seconds, it is discarded without being processed and
+                        the future's exception is set to TimeoutError.
+                        If None, the message never expires.
+
+        :returns: a concurrent.futures.Future.  It is cancelled if the
+                  mailbox drops the message.
+
+        :raises MailboxFull: see comm().
+        """
+        future = concurrent.futures.Future()
+        now = time.monotonic()
+        deadline = None if timeout is None else now + timeout
+        enqueued = None if self._metrics is None else now
+        self.comm(_Envelope(message, future, deadline, enqueued))
+        return future
+    #ask
+
+
+    def askAsync(self,
+                 message: Message,
+                 timeout: float|None = None) -> asyncio.Future:
+        """
+        Like ask(), but returns an asyncio future that can be awaited in the
+        running event loop.
+        """
+        return asyncio.wrap_future(self.ask(message, timeout))
+    #askAsync
+
+#_AskingDispatcher
+
+
+class _ReactiveComponent(Thread, _MessageDispatcher):
+    """
+    What ReactiveThread and ReactiveProcess have in common: the message
+    processing loop of the thread or process that processes the messages.
+    """
+
+    def __init__(self,
+                 name: str,
+                 batchSize: int = 1,
+                 mailbox: Mailbox|None = None):
+        """
+        Constructor.
+
+        :param name:      The component's name.
+
+        :param batchSize: Maximum number of queued messages processed per
+                          wakeup.  Must be >= 1.
+
+        :param mailbox:   The mailbox that messages are taken from.  If None,
+                          an unbounded Mailbox is used.
+        """
+        if batchSize < 1:
+            raise ValueError("'batchSize' must be >= 1")
+        #if
+        super().__init__(name)
+        self._batchSize = batchSize
+        self._messages = Mailbox() if mailbox is None else mailbox
+    #__init__
+
+
+    def threadCodePre(self) -> None:
+        """
+        Override this method to implement code that needs to be executed
+        once BEFORE the message processing loop.
+        """
+        pass
+    #threadCodePre
+
+
+    def threadCodePost(self) -> None:
+        """
+        Override this method to implement code that needs to be executed
+        once AFTER the message processing loop.
+        """
+        pass
+    #threadCodePost
+
+
+    def _processMessages(self, messages: list) -> bool:
+        """
+        Processes messages in order.  Messages that follow a QuitMessage, or
+        that are left when the running flag is set to False, are put back into
+        the mailbox.
+
+        :returns: True iff a QuitMessage was received.
+        """
+        cache = self._dispatchCache
+        logInfo = _logger.isEnabledFor(logging.INFO)
+        i = 0
+        n = len(messages)
+        while i < n:
+            if i and not self._running:
+                self._messages.putBack(messages[i:])
+                return False
+            #if
+            message = messages[i]
+            messageClass = type(message)
+            if messageClass is _Envelope:
+                i += 1
+                kind, processor = self._openEnvelope(message)
+                if processor is not None:
+                    inner = message.message
+                    self._callEnveloped(processor,
+                                        inner if kind == _SINGLE else [inner],
+                                        message)
+                elif kind == _QUIT:
+                    if i < n:
+                        self._messages.putBack(messages[i:])
+                    #if
+                    return True
+                #elif
+                continue
+            #if
+            try:
+                kind, processor = cache[messageClass]
+            except KeyError:
+                kind, processor = cache[messageClass] \
+                    = self._resolve(messageClass)
+            #except
+            if logInfo:
+                _logger.info("%s: received message of type %s",
+                             self._name, messageClass.__name__)
+            #if
+            if kind == _SINGLE:
+                processor(message)
+                i += 1
+            elif kind == _BATCH:
+                j = i + 1
+                while j < n and type(messages[j]) is messageClass:
+                    j += 1
+                #while
+                processor(messages[i:j])
+                i = j
+            elif kind == _QUIT:
+                if logInfo:
+                    _logger.info("%s: received QuitMessage", self._name)
+                #if
+                if i + 1 < n:
+                    self._messages.putBack(messages[i + 1:])
+                #if
+                return True
+            else:
+                self._unknownMessage(messageClass)
+                i += 1
+            #else
+        #while
+        return False
+    #_processMessages
+
+#_ReactiveComponent
+
+
+class ReactiveThread(_ReactiveComponent, _AskingDispatcher):
+    """
+    Base class for an asynchronous component with a standard infinite loop for
+    message processing.
+
+    The component waits for incoming messages and processes them serially (in
+    receival order) until either a QuitMessage is received, or until
+    the running flag is set to False (e.g. call to stop()).
+    Note that if the running flag is set to False, the loop is exited as soon as
+    possible, so some queued messages may remain unprocessed.
+
+    The right way to derive from this class is to define a method for each class
+    of messages that may be sent to the component, for example:
+
+        def processSomeMsgClass(message: SomeMsgClass) -> None:
+            ...
+
+    where SomeMsgClass derives from Message.
+
+    Then, register those message processing methods by calling
+    addMessageProcessor in __init__, for example:
+
+        self.addMessageProcessor(SomeMsgClass, self.processSomeMsgClass)
+
+    or by decorating them with messageProcessor(SomeMsgClass).
+
+    A message is processed by the processor registered for the nearest class
+    in its class's MRO, so a processor registered for a base class also
+    handles messages of derived classes.  The lookup is done once per message
+    class and cached.
+
+    With batchSize > 1, the loop takes up to batchSize queued messages per
+    wakeup.  Messages are still processed in receival order.  A method
+    registered with addBatchMessageProcessor receives each run of consecutive
+    messages of its class as one list, for example:
+
+        def processSomeMsgClassBatch(messages: list[SomeMsgClass]) -> None:
+            ...
+
+        self.addBatchMessageProcessor(SomeMsgClass,
+                                      self.processSomeMsgClassBatch)
+
+    This class uses the module's logger.  Set the logging level and whether to
+    use colour with setLoggingOptions(level, colour={True|False}).
+    """
+
+    def __init__(self,
+                 name: str,
+                 messageWaitingTime: float|None = None,
+                 batchSize: int = 1,
+                 mailbox: Mailbox|None = None):
+        """
+        Constructor.
+
+        :param name:               The thread's name.
+
+        :param messageWaitingTime: Maximum time in seconds to wait for the next
+                                   message.  If None (recommended), wait for
+                                   ever.  stop() wakes up a waiting component
+                                   immediately, so an idle component neither
+                                   uses CPU time nor delays stop().
+                                   This is a performance parameter only.
+                                   Messages are NEVER dropped and ALWAYS
+                                   processed as soon as possible.
+                                   If this parameter's value is too small,
+                                   it may result in busy waiting.
+
+        :param batchSize:          Maximum number of queued messages taken from
+                                   the mailbox per wakeup.  Must be >= 1.
+
+        :param mailbox:            The mailbox that comm() puts messages into,
+                                   e.g. a bounded one.  If None, an unbounded
+                                   Mailbox is used.
+        """
+        super().__init__(name, batchSize, mailbox)
+        self._messageWaitingTime = messageWaitingTime
+        self._executorSlot = None
+        self._recorder = None
+    #__init__
+
+
+    def stop(self) -> None:
+        """
+        See Thread.stop().  Also works if the component runs on an
+        ActorExecutor.
+        """
+        slot = self._executorSlot
+        if slot is None:
+            super().stop()
+        else:
+            slot.executor._stopActor(slot)
+        #else
+    #stop
+
+
+    def wait(self) -> None:
+        """
+        See Thread.wait().  Also works if the component runs on an
+        ActorExecutor.
+        """
+        slot = self._executorSlot
+        if slot is None:
+            super().wait()
+        else:
+            slot.done.wait()
+        #else
+    #wait
+
+
+    def _stopWaiter(self, signal: bool) -> Callable[[float|None], bool]:
+        slot = self._executorSlot
+        if slot is None:
+            return super()._stopWaiter(signal)
+        #if
+        if signal:
+            slot.executor._stopActor(slot, wait = False)
+        #if
+        return slot.done.wait
+    #_stopWaiter
+
+
+    def comm(self,
+             message: Message,
+             ttl: float|None = None,
+             deadline: float|None = None) -> None:
+        """
+        Queues up a message and returns immediately, unless the mailbox is
+        full and its overflow policy is OverflowPolicy.BLOCK.
+
+        A message with a TTL or deadline that is still queued when it expires
+        is discarded without being processed, counted (see expiredCount())
+        and passed to the dead-letter handler (see setDeadLetterHandler()).
+        This bounds latency under overload, because no time is spent on
+        results that nobody waits for anymore.
+
+        :param message:  An instance of a class derived from Message.
+
+        :param ttl:      Time to live in seconds, or None.
+
+        :param deadline: Time (as returned by time.monotonic()) after which
+                         the message expires, or None.  If both 'ttl' and
+                         'deadline' are given, the earlier one applies.
+
+        :raises MailboxFull: if the mailbox is full and its overflow policy
+                             rejects the message.
+        """
+        if ttl is not None or deadline is not None:
+            deadline = _deadline(ttl, deadline)
+        #if
+        recorder = self._recorder
+        if deadline is not None or recorder is not None \
+                or self._metrics is not None:
+            if type(message) is not _Envelope:
+                message = _Envelope(message, None, deadline,
+                                    None if self._metrics is None
+                                    else time.monotonic())
+            #if
+            if recorder is not None:
+                recorder._recordComm(message)
+            #if
+        #if
+        self._messages.put(message)
+    #comm
+
+
+    async def commAsync(self, message: Message) -> None:
+        """
+        Like comm(), but for use in a coroutine, e.g. in a processor of an
+        AsyncReactiveActor.  If the mailbox is bounded, waits for room in an
+        executor thread so that the event loop is not blocked.
+
+        :param message: An instance of a class derived from Message.
+
+        :raises MailboxFull: see comm().
+        """
+        if self._messages.capacity() is None:
+            self.comm(message)
+        else:
+            await asyncio.get_running_loop().run_in_executor(None,
+                                                             self.comm,
+                                                             message)
+        #else
+    #commAsync
+
+
+    def enableMetrics(self, enabled: bool = True) -> None:
+        """
+        Switches the collection of runtime metrics on or off.  While metrics
+        are off, they cost nothing.  Switching them on resets them.
+
+        :param enabled: Whether to collect metrics.
+        """
+        self._metrics = ActorMetrics(self._name) if enabled else None
+        self._dispatchCache.clear()
+    #enableMetrics
+
+
+    def metrics(self) -> ActorMetrics|None:
+        """
+        :returns: the component's metrics, or None if metrics are off.
+        """
+        return self._metrics
+    #metrics
+
+
+    def recordTrace(self, recorder: TraceRecorder|None) -> None:
+        """
+        Starts recording the messages sent with comm() or ask(), and their
+        processing, with the given recorder, or stops recording if None.
+        While recording, a batch message processor receives messages one at a
+        time, as lists of length 1.
+
+        :param recorder: A TraceRecorder, or None.
+        """
+        self._recorder = recorder
+    #recordTrace
+
+
+    def mailbox(self) -> Mailbox:
+        """
+        :returns: the mailbox, e.g. to read its counters.
+        """
+        return self._messages
+    #mailbox
+
+
+    def threadCode(self) -> None:
+        """
+        Do NOT override this method.
+        This is where the message processing loop is implemented.
+        """
+        self._messages.clearInterrupt()
+        self.threadCodePre()
+        while self._running:
+            messages = self._messages.get(self._batchSize,
+                                          self._messageWaitingTime)
+            if not messages:
+                continue
+            #if
+            if self._metrics is not None:
+                messages = self._metrics._observe(messages,
+                                                  self._messages.qsize())
+            #if
+            if self._processMessages(messages):
+                break
+            #if
+        #while
+        self.threadCodePost()
+    #threadCode
+
+
+    def _wakeUp(self) -> None:
+        self._messages.interrupt()
+    #_wakeUp
+
+#ReactiveThread
+
+
+class ReactiveThreadPool(ReactiveThread):
+    """
+    Like ReactiveThread, but the messages are processed by several worker
+    threads that share one mailbox.  Derive from this class exactly as you
+    would derive from ReactiveThread.  Message processors must be
+    thread-safe.
+
+    Messages are processed in parallel and hence not necessarily in receival
+    order.  If an affinity key function is given, messages with the same key
+    are processed serially in receival order, while messages with different
+    keys are processed in parallel.  A worker that holds a key processes all
+    messages with that key that arrive in the meantime, so with few keys, a
+    large batchSize reduces parallelism.
+
+    As soon as a worker takes a QuitMessage from the mailbox, the mailbox is
+    interrupted, so that no worker takes messages queued after it.  The
+    workers finish the messages they have already taken (all of which were
+    queued before the QuitMessage), and then all workers quit.
+
+    threadCodePre() and threadCodePost() are executed once in each worker.
+    """
+
+    def __init__(self,
+                 name: str,
+                 workers: int,
+                 messageWaitingTime: float|None = None,
+                 batchSize: int = 1,
+                 mailbox: Mailbox|None = None,
+                 affinityKey: Callable[[Message], Hashable]|None = None):
+        """
+        Constructor.
+
+        :param name:               The pool's name.  Worker threads are named
+                                   '<name>-<index>'.
+
+        :param workers:            Number of worker threads.  Must be >= 1.
+
+        :param messageWaitingTime: See ReactiveThread.
+
+        :param batchSize:          See ReactiveThread.
+
+        :param mailbox:            See ReactiveThread.
+
+        :param affinityKey:        A function that maps a message to its
+                                   affinity key, or to None if the message may
+                                   be processed in any order.  If None, all
+                                   messages may be processed in any order.
+        """
+        if workers < 1:
+            raise ValueError("'workers' must be >= 1")
+        #if
+        super().__init__(name, messageWaitingTime, batchSize, mailbox)
+        self._messages._interruptOnQuit = True
+        self._workers = workers
+        self._threads = []
+        self._activeWorkers = 0
+        self._quit = False
+        self._affinityKey = affinityKey
+        self._busyKeys = dict()
+        self._keyLock = threading.Lock()
+    #__init__
+
+
+    def start(self) -> None:
+        """
+        Starts the worker threads, sets the running flag to True, and returns
+        immediately.
+
+        If the workers are already running, does nothing.
+        """
+        self._lock.acquire()
+        if self._running:
+            _logger.warning("thread pool '%s' already running", self._name)
+        else:
+            self._running = True
+            self._quit = False
+            self._messages.clearInterrupt()
+            self._activeWorkers = self._workers
+            self._threads = [
+                threading.Thread(target = self._workerCode,
+                                 name = "%s-%d" % (self._name, i),
+                                 daemon = True)
+                for i in range(self._workers) ]
+            for thread in self._threads:
+                thread.start()
+            #for
+        #else
+        self._lock.release()
+    #start
+
+
+    def stop(self) -> None:
+        """
+        Sets the running flag to False and waits for all workers to return.
+        Each worker returns as soon as it has finished the message it is
+        processing.
+        """
+        self._lock.acquire()
+        if self._running and self._threads:
+            self._running = False
+            self._wakeUp()
+            for thread in self._threads:
+                thread.join()
+            #for
+            self._threads = []
+        #if
+        self._lock.release()
+    #stop
+
+
+    def wait(self) -> None:
+        """
+        Waits for all workers to return, but does not request a stop.
+        """
+        self._lock.acquire()
+        for thread in self._threads:
+            thread.join()
+        #for
+        self._threads = []
+        self._lock.release()
+    #wait
+
+
+    def _stopWaiter(self, signal: bool) -> Callable[[float|None], bool]:
+        with self._lock:
+            if signal and self._running:
+                self._running = False
+                self._wakeUp()
+            #if
+            threads = list(self._threads)
+        #with
+        return lambda timeout: _joinThreads(threads, timeout)
+    #_stopWaiter
+
+
+    def threadCode(self) -> None:
+        """
+        Not used.  The workers run the message processing loop.
+        """
+        pass
+    #threadCode
+
+
+    def _workerCode(self) -> None:
+        name = threading.current_thread().name
+        try:
+            _logger.info("starting thread '%s'", name)
+            self.threadCodePre()
+            while self._running and not self._quit:
+                messages = self._messages.get(self._batchSize,
+                                              self._messageWaitingTime)
+                if not messages:
+                    if self._messages._interrupted:
+                        break # another worker took a QuitMessage
+                    #if
+                    continue
+                #if
+                if self._metrics is not None:
+                    messages = self._metrics._observe(messages,
+                                                      self._messages.qsize())
+                #if
+                if self._affinityKey is None:
+                    quit = self._processMessages(messages)
+                else:
+                    quit = self._processKeyedMessages(messages)
+                #else
+                if quit:
+                    self._quit = True
+                    self._messages.interrupt()
+                #if
+            #while
+            self.threadCodePost()
+            _logger.info("terminating thread '%s'", name)
+        except Exception as e:
+            _logger.error("exception in thread '%s': %s", name, e)
+            raise e
+        finally:
+            with self._keyLock:
+                self._activeWorkers -= 1
+                if self._activeWorkers == 0:
+                    self._running = False
+                #if
+            #with
+        #finally
+    #_workerCode
+
+
+    def _processKeyedMessages(self, messages: list) -> bool:
+        """
+        Processes messages taken from the mailbox by one worker.
+
+        Each keyed message is either claimed by this worker (if no worker is
+        processing its key) or handed to the worker that holds its key.
+        The holder of a key processes all messages handed to it for that key,
+        in order, before it releases the key.
+
+        :returns: True iff a QuitMessage was received.
+        """
+        claimed = []
+        quit = None
+        affinityKey = self._affinityKey
+        with self._keyLock:
+            for i, message in enumerate(messages):
+                if isinstance(_unwrap(message), QuitMessage):
+                    quit = message
+                    if i + 1 < len(messages):
+                        self._messages.putBack(messages[i + 1:])
+                    #if
+                    break
+                #if
+                key = affinityKey(_unwrap(message))
+                if key is None:
+                    claimed.append((None, message))
+                elif key in self._busyKeys:
+                    self._busyKeys[key].append(message)
+                else:
+                    self._busyKeys[key] = collections.deque()
+                    claimed.append((key, message))
+                #else
+            #for
+        #with
+
+        for index, (key, message) in enumerate(claimed):
+            if not self._running:
+                self._putBackClaims(claimed[index:])
+                return False
+            #if
+            try:
+                self._processMessages([message])
+                if key is None:
+                    continue
+                #if
+                pending = self._busyKeys[key]
+                while True:
+                    with self._keyLock:
+                        if not pending:
+                            del self._busyKeys[key]
+                            break
+                        #if
+                        message = pending.popleft()
+                    #with
+                    if not self._running:
+                        self._putBackClaims([(key, message)]
+                                            + claimed[index + 1:])
+                        return False
+                    #if
+                    self._processMessages([message])
+                #while
+            except BaseException:
+                # release the keys held by this worker, so that their
+                # messages are not stranded; the failed message is dropped
+                leftovers = []
+                with self._keyLock:
+                    if key is not None:
+                        leftovers.extend(self._busyKeys.pop(key, ()))
+                    #if
+                    for laterKey, laterMessage in claimed[index + 1:]:
+                        leftovers.append(laterMessage)
+                        if laterKey is not None:
+                            leftovers.extend(self._busyKeys.pop(laterKey))
+                        #if
+                    #for
+                #with
+                if quit is not None:
+                    leftovers.append(quit)
+                #if
+                if leftovers:
+                    self._messages.putBack(leftovers)
+                #if
+                raise
+            #except
+        #for
+
+        return quit is not None and self._processMessages([quit])
+    #_processKeyedMessages
+
+
+    def _putBackClaims(self, claims: list) -> None:
+        """
+        Releases the given claims and puts their messages, together with the
+        messages handed to them, back into the mailbox.  The order of
+        messages with the same key is preserved.
+        """
+        leftovers = []
+        with self._keyLock:
+            for key, message in claims:
+                leftovers.append(message)
+                if key is not None:
+                    leftovers.extend(self._busyKeys.pop(key))
+                #if
+            #for
+        #with
+        self._messages.putBack(leftovers)
+    #_putBackClaims
+
+#ReactiveThreadPool
+
+
+class ReactiveProcess(_ReactiveComponent):
+    """
+    Like ReactiveThread, but the message processing loop runs in a child
+    process, so that CPU-bound message processors are not limited by the
+    GIL.  Derive from this class exactly as you would derive from
+    ReactiveThread.
+
+    It is not a ReactiveThread: features that need the processing to happen
+    in the sending process (ask(), metrics, trace recording, the mailbox and
+    commAsync()) are not available.  expiredCount() is forwarded from the
+    child.  The dead-letter handler must be set before start(); it runs in
+    the child.
+
+    Messages are pickled and sent to the child through a pipe, so they must
+    be picklable.  With a start method other than 'fork', the component
+    itself (including its message processors) must be picklable too.
+    threadCodePre(), the message processors and threadCodePost() run in the
+    child and act on the child's copy of the component; changes to its state
+    are not visible in the parent.
+
+    comm() blocks while the pipe is full.  Messages that are queued after a
+    QuitMessage are discarded when the child exits.
+    """
+
+    def __init__(self,
+                 name: str,
+                 batchSize: int = 1,
+                 startMethod: str|None = None):
+        """
+        Constructor.
+
+        :param name:        The component's name.  Also used as the child
+                            process's name.
+
+        :param batchSize:   Maximum number of messages the child reads from the
+                            pipe per wakeup.  Must be >= 1.
+
+        :param startMethod: The multiprocessing start method, e.g. 'spawn'.
+                            If None, the platform's default is used.
+        """
+        super().__init__(name, batchSize)
+        self._context = multiprocessing.get_context(startMethod)
+        self._expiredShared = self._context.Value("q", 0)
+        self._receiver, self._sender = self._context.Pipe(duplex = False)
+        self._stopReceiver, self._stopSender = \
+            self._context.Pipe(duplex = False)
+        self._sendLock = threading.Lock()
+        self._process = None
+    #__init__
+
+
+    def __getstate__(self) -> dict:
+        state = self.__dict__.copy()
+        for attr in ("_lock", "_thread", "_messages", "_context", "_sender",
+                     "_stopSender", "_sendLock", "_process", "_expiredLock"):
+            state[attr] = None
+        #for
+        return state
+    #__getstate__
+
+
+    def __setstate__(self, state: dict) -> None:
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+        self._messages = Mailbox()
+        self._expiredLock = threading.Lock()
+    #__setstate__
+
+
+    def running(self) -> bool:
+        """
+        :returns: True iff the child process is alive.
+        """
+        return self._process is not None and self._process.is_alive()
+    #running
+
+
+    def start(self) -> None:
+        """
+        Starts the child process and returns immediately.
+
+        If the child process is already running, does nothing.
+        """
+        with self._lock:
+            if self.running():
+                _logger.warning("process '%s' already running", self._name)
+                return
+            #if
+            while self._stopReceiver.poll():
+                self._stopReceiver.recv()
+            #while
+            self._process = self._context.Process(target = self._processCode,
+                                                  name = self._name,
+                                                  daemon = True)
+            self._process.start()
+        #with
+    #start
+
+
+    def stop(self) -> None:
+        """
+        Asks the child process to quit as soon as possible and waits for it to
+        exit.  Some queued messages may remain unprocessed.
+        """
+        with self._lock:
+            if self.running():
+                self._stopSender.send(None)
+                self._process.join()
+            #if
+            self._process = None
+        #with
+    #stop
+
+
+    def wait(self) -> None:
+        """
+        Waits for the child process to exit, but does not request a stop.
+        """
+        with self._lock:
+            if self._process is not None:
+                self._process.join()
+            #if
+            self._process = None
+        #with
+    #wait
+
+
+    def _stopWaiter(self, signal: bool) -> Callable[[float|None], bool]:
+        with self._lock:
+            process = self._process
+            if process is None or not process.is_alive():
+                return lambda timeout: True
+            #if
+            if signal:
+                self._stopSender.send(None)
+            #if
+        #with
+
+        def waiter(timeout: float|None) -> bool:
+            process.join(timeout)
+            return not process.is_alive()
+        #waiter
+
+        return waiter
+    #_stopWaiter
+
+
+    def comm(self,
+             message: Message,
+             ttl: float|None = None,
+             deadline: float|None = None) -> None:
+        """
+        Sends a message to the child process.  Blocks while the pipe is full.
+
+        Expired messages are discarded as described in ReactiveThread.comm(),
+        but are counted, and passed to the dead-letter handler, in the child.
+
+        :param message:  A picklable instance of a class derived from Message.
+
+        :param ttl:      See ReactiveThread.comm().
+
+        :param deadline: See ReactiveThread.comm().
+        """
+        if ttl is not None or deadline is not None:
+            message = _Envelope(message, None, _deadline(ttl, deadline))
+        #if
+        with self._sendLock:
+            self._sender.send(message)
+        #with
+    #comm
+
+
+    def expiredCount(self) -> int:
+        """
+        :returns: the number of messages discarded by the child because they
+                  expired.
+        """
+        return self._expiredShared.value
+    #expiredCount
+
+
+    def _countExpired(self) -> None:
+        with self._expiredShared.get_lock():
+            self._expiredShared.value += 1
+        #with
+    #_countExpired
+
+
+    def _processCode(self) -> None:
+        """
+        The child process's main function.
+        """
+        self._running = True
+        self._threadCode()
+    #_processCode
+
+
+    def threadCode(self) -> None:
+        """
+        Do NOT override this method.
+        This is the message processing loop, as run in the child process.
+        """
+        receiver = self._receiver
+        stopReceiver = self._stopReceiver
+        self.threadCodePre()
+        while self._running:
+            messages = self._messages.get(self._batchSize, 0)
+            if not messages:
+                ready = multiprocessing.connection.wait([receiver,
+                                                         stopReceiver])
+                if stopReceiver in ready:
+                    break
+                #if
+                messages.append(receiver.recv())
+                while len(messages) < self._batchSize and receiver.poll():
+                    messages.append(receiver.recv())
+                #while
+            #if
+            if self._processMessages(messages):
+                break
+            #if
+        #while
+        self.threadCodePost()
+    #threadCode
+
+#ReactiveProcess
+
+
+class ReactiveProcessPool:
+    """
+    A group of ReactiveProcess instances that is used like one component.
+
+    comm() hands each message to one of the processes: messages with the
+    same affinity key always go to the same process (and are hence processed
+    in receival order), other messages are distributed round-robin.
+    A QuitMessage is sent to all processes.
+    """
+
+    def __init__(self,
+                 factory: Callable[[int], ReactiveProcess],
+                 processes: int,
+                 affinityKey: Callable[[Message], Hashable]|None = None):
+        """
+        Constructor.
+
+        :param factory:     A function that creates the i-th process, e.g. a
+                            ReactiveProcess subclass that takes the index as
+                            its only argument.
+
+        :param processes:   Number of processes.  Must be >= 1.
+
+        :param affinityKey: A function that maps a message to its affinity
+                            key, or to None if the message may go to any
+                            process.  If None, all messages may go to any
+                            process.
+        """
+        if processes < 1:
+            raise ValueError("'processes' must be >= 1")
+        #if
+        self._members = [ factory(i) for i in range(processes) ]
+        self._affinityKey = affinityKey
+        self._next = itertools.count()
+    #__init__
+
+
+    def members(self) -> list[ReactiveProcess]:
+        """
+        :returns: the processes.
+        """
+        return self._members
+    #members
+
+
+    def running(self) -> bool:
+        """
+        :returns: True iff any of the processes is running.
+        """
+        return any(member.running() for member in self._members)
+    #running
+
+
+    def start(self) -> None:
+        """
+        Starts all processes.
+        """
+        for member in self._members:
+            member.start()
+        #for
+    #start
+
+
+    def stop(self) -> None:
+        """
+        Stops all processes.  See ReactiveProcess.stop().
+        """
+        for member in self._members:
+            member.stop()
+        #for
+    #stop
+
+
+    def wait(self) -> None:
+        """
+        Waits for all processes to exit.
+        """
+        for member in self._members:
+            member.wait()
+        #for
+    #wait
+
+
+    def comm(self,
+             message: Message,
+             ttl: float|None = None,
+             deadline: float|None = None) -> None:
+        """
+        Sends a message to one of the processes, or a QuitMessage to all of
+        them.
+
+        :param message:  A picklable instance of a class derived from Message.
+
+        :param ttl:      See ReactiveThread.comm().
+
+        :param deadline: See ReactiveThread.comm().
+        """
+        if isinstance(message, QuitMessage):
+            for member in self._members:
+                member.comm(message)
+            #for
+            return
+        #if
+        key = None if self._affinityKey is None else self._affinityKey(message)
+        if key is None:
+            index = next(self._next)
+        else:
+            index = hash(key)
+        #else
+        self._members[index % len(self._members)].comm(message, ttl, deadline)
+    #comm
+
+#ReactiveProcessPool
+
+
+def _joinThreads(threads: list[threading.Thread], timeout: float|None) -> bool:
+    """
+    Joins threads, waiting at most 'timeout' seconds in total.
+
+    :returns: True iff all threads have terminated.
+    """
+    deadline = None if timeout is None else time.monotonic() + timeout
+    for thread in threads:
+        thread.join(None if deadline is None
+                    else max(0.0, deadline - time.monotonic()))
+        if thread.is_alive():
+            return False
+        #if
+    #for
+    return True
+#_joinThreads
+
+
+class ThreadGroup:
+    """
+    A set of asynchronous components (Thread, ReactiveThread and derived
+    classes, ReactiveProcessPool, Pipeline, ...) that are started and stopped
+    together.
+
+    stop() first asks all members to stop and only then waits for them, with
+    one deadline for the whole group, so that stopping N members takes as
+    long as stopping the slowest one instead of the sum of all.
+    """
+
+    def __init__(self, members: Iterable|None = None):
+        """
+        Constructor.
+
+        :param members: The initial members.
+        """
+        self._members = []
+        for member in members or ():
+            self.add(member)
+        #for
+    #__init__
+
+
+    def add(self, member) -> None:
+        """
+        Adds a member.
+
+        :param member: An object with (blocking, not async) start(), stop()
+                       and wait() methods.
+        """
+        if inspect.iscoroutinefunction(member.stop):
+            raise TypeError("cannot add %s to a ThreadGroup"
+                            % type(member).__name__)
+        #if
+        self._members.append(member)
+    #add
+
+
+    def members(self) -> list:
+        """
+        :returns: the members, in the order they were added.
+        """
+        return list(self._members)
+    #members
+
+
+    def start(self) -> None:
+        """
+        Starts all members, in the order they were added.
+        """
+        for member in self._members:
+            member.start()
+        #for
+    #start
+
+
+    def stop(self, timeout: float|None = None) -> list:
+        """
+        Asks all members to stop, then waits for them.
+
+        :param timeout: Maximum time in seconds to wait for all members
+                        together.  If None, wait for ever.
+
+        :returns: the members that have not stopped in time (an empty list on
+                  success).  They are logged at WARNING level.
+        """
+        return self._join(True, timeout)
+    #stop
+
+
+    def wait(self, timeout: float|None = None) -> list:
+        """
+        Waits for all members to stop, but does not request a stop.
+
+        :param timeout: See stop().
+
+        :returns: the members that have not stopped in time.
+        """
+        return self._join(False, timeout)
+    #wait
+
+
+    def _join(self, signal: bool, timeout: float|None) -> list:
+        deadline = None if timeout is None else time.monotonic() + timeout
+        waiters = [ (member, self._waiter(member, signal))
+                    for member in self._members ]
+        failed = []
+        for member, waiter in waiters:
+            remaining = None if deadline is None \
+                else max(0.0, deadline - time.monotonic())
+            if not waiter(remaining):
+                failed.append(member)
+            #if
+        #for
+        if failed:
+            _logger.warning("members not stopped in time: %s",
+                            ", ".join(self._memberName(m) for m in failed))
+        #if
+        return failed
+    #_join
+
+
+    @staticmethod
+    def _waiter(member, signal: bool) -> Callable[[float|None], bool]:
+        """
+        :returns: the member's stop waiter (see Thread._stopWaiter()).  For
+                  members without one, stop() or wait() is run in a helper
+                  thread, and the waiter joins that thread.
+        """
+        if isinstance(member, Thread):
+            return member._stopWaiter(signal)
+        #if
+        helper = threading.Thread(target = member.stop if signal
+                                  else member.wait,
+                                  daemon = True)
+        helper.start()
+        return lambda timeout: _joinThreads([helper], timeout)
+    #_waiter
+
+
+    @staticmethod
+    def _memberName(member) -> str:
+        name = getattr(member, "name", None)
+        return name() if callable(name) else repr(member)
+    #_memberName
+
+#ThreadGroup
+
+
+def _socketFamily(address: str|tuple) -> int:
+    """
+    :returns: the socket family for an address: a file name (Unix domain
+              socket) or a tuple (host, port) (TCP).
+    """
+    return socket.AF_UNIX if isinstance(address, str) else socket.AF_INET
+#_socketFamily
+
+
+_FRAME = struct.Struct("<I")
+
+
+class ActorServer(Thread):
+    """
+    Asynchronous component that accepts connections from ActorClient
+    instances, possibly in other processes, and delivers the messages it
+    receives to the components registered under the target names.
+
+    Messages are pickled, so they must be picklable.  Each connection is
+    read by a thread of its own; messages from one connection are delivered
+    in the order they were sent.  Delivery uses the component's comm(), so a
+    full bounded mailbox slows down the sender.
+
+    SECURITY: connections are not authenticated, and every message is
+    unpickled, which can execute arbitrary code.  Anyone who can connect can
+    hence take over the process.  Therefore, TCP addresses must be loopback
+    addresses unless 'allowRemote' is set, and Unix domain sockets should be
+    placed in a directory that only trusted users can access.
+    """
+
+    def __init__(self,
+                 name: str,
+                 address: str|tuple,
+                 allowRemote: bool = False):
+        """
+        Constructor.  Binds the listening socket, so that clients may connect
+        (and be queued up) before start() is called.
+
+        :param name:    The server's name.
+
+        :param address: A file name for a Unix domain socket (an existing file
+                        is replaced), or a tuple (host, port) for TCP.  Port 0
+                        selects a free port; see address().
+
+        :param allowRemote: If True, allow TCP addresses that are not loopback
+                            addresses.  Only do this on a network where every
+                            host that can reach the port is trusted (see the
+                            class's documentation).
+
+        :raises ValueError: if 'address' is a TCP address that is not a
+                            loopback address and 'allowRemote' is False.
+        """
+        if _socketFamily(address) == socket.AF_INET and not allowRemote:
+            host = socket.gethostbyname(address[0] or "0.0.0.0")
+            if not ipaddress.ip_address(host).is_loopback:
+                raise ValueError("refusing to listen on non-loopback address "
+                                 "'%s' without 'allowRemote'" % address[0])
+            #if
+        #if
+        super().__init__(name)
+        self._requestedAddress = address
+        self._listener = None
+        self._actors = dict()
+        self._connections = dict()
+        self._connectionLock = threading.Lock()
+        self._wakeReceiver = self._wakeSender = None
+        self._received = 0
+        self._undelivered = 0
+        self._bind()
+    #__init__
+
+
+    def address(self) -> str|tuple:
+        """
+        :returns: the address the server listens on, with the actual port if
+                  port 0 was requested.
+        """
+        return self._address
+    #address
+
+
+    def register(self, name: str, actor) -> None:
+        """
+        Makes a component reachable under a name.
+
+        :param name:  The name that clients use (see ActorClient.actor()).
+
+        :param actor: Any object with a comm() method, e.g. a ReactiveThread.
+        """
+        self._actors[name] = actor
+    #register
+
+
+    def unregister(self, name: str) -> None:
+        """
+        Makes a component unreachable.  Messages for it are counted as
+        undelivered.
+
+        :param name: The name the component was registered under.
+        """
+        self._actors.pop(name, None)
+    #unregister
+
+
+    def receivedCount(self) -> int:
+        """
+        :returns: the number of messages received.
+        """
+        return self._received
+    #receivedCount
+
+
+    def undeliveredCount(self) -> int:
+        """
+        :returns: the number of messages received for unregistered names.
+        """
+        return self._undelivered
+    #undeliveredCount
+
+
+    def start(self) -> None:
+        """
+        See Thread.start().  Rebinds the listening socket if the server was
+        stopped.
+        """
+        with self._lock:
+            if self._listener is None and not self._running:
+                self._bind()
+            #if
+        #with
+        super().start()
+    #start
+
+
+    def threadCode(self) -> None:
+        self._wakeReceiver, self._wakeSender = socket.socketpair()
+        try:
+            while self._running:
+                ready, _, _ = select.select([self._listener,
+                                             self._wakeReceiver], [], [])
+                if self._wakeReceiver in ready:
+                    break
+                #if
+                try:
+                    connection, _ = self._listener.accept()
+                except OSError:
+                    continue
+                #except
+                thread = threading.Thread(target = self._connectionCode,
+                                          args = (connection,),
+                                          name = "%s-connection" % self._name,
+                                          daemon = True)
+                with self._connectionLock:
+                    self._connections[connection] = thread
+                #with
+                thread.start()
+            #while
+        finally:
+            with self._connectionLock:
+                connections = list(self._connections.items())
+            #with
+            for connection, thread in connections:
+                try:
+                    connection.shutdown(socket.SHUT_RDWR)
+                except OSError:
+                    pass  # already disconnected
+                #except
+                thread.join()
+            #for
+            self._close()
+        #finally
+    #threadCode
+
+
+    def _wakeUp(self) -> None:
+        if self._wakeSender is not None:
+            self._wakeSender.send(b"\0")
+        #if
+    #_wakeUp
+
+
+    def _bind(self) -> None:
+        address = self._requestedAddress
+        family = _socketFamily(address)
+        if family == socket.AF_UNIX and os.path.exists(address):
+            os.unlink(address)
+        #if
+        self._listener = socket.socket(family, socket.SOCK_STREAM)
+        if family == socket.AF_INET:
+            self._listener.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR,
+                                      1)
+        #if
+        self._listener.bind(address)
+        self._listener.listen()
+        self._address = self._listener.getsockname()
+    #_bind
+
+
+    def _close(self) -> None:
+        self._listener.close()
+        self._listener = None
+        if _socketFamily(self._address) == socket.AF_UNIX:
+            try:
+                os.unlink(self._address)
+            except OSError:
+                pass  # already removed
+            #except
+        #if
+        self._wakeReceiver.close()
+        self._wakeSender.close()
+        self._wakeReceiver = self._wakeSender = None
+    #_close
+
+
+    def _connectionCode(self, connection: socket.socket) -> None:
+        """
+        Reads frames from a connection and delivers their messages until the
+        connection is closed.
+        """
+        reader = connection.makefile("rb")
+        try:
+            while True:
+                header = reader.read(_FRAME.size)
+                if len(header) < _FRAME.size:
+                    break
+                #if
+                size, = _FRAME.unpack(header)
+                payload = reader.read(size)
+                if len(payload) < size:
+                    break
+                #if
+                batch = pickle.loads(payload)
+                with self._connectionLock:
+                    self._received += len(batch)
+                #with
+                for name, message in batch:
+                    actor = self._actors.get(name)
+                    if actor is None:
+                        _logger.warning("%s: no component named '%s'",
+                                        self._name, name)
+                        with self._connectionLock:
+                            self._undelivered += 1
+                        #with
+                    else:
+                        actor.comm(message)
+                    #else
+                #for
+            #while
+        except OSError:
+            pass  # connection reset
+        except Exception as e:
+            _logger.error("%s: exception while reading: %s", self._name, e)
+        finally:
+            reader.close()
+            connection.close()
+            with self._connectionLock:
+                self._connections.pop(connection, None)
+            #with
+        #finally
+    #_connectionCode
+
+#ActorServer
+
+
+class _RemoteMessage(Message):
+    """
+    A message for a named component behind an ActorClient.
+    """
+    __slots__ = ("name", "message")
+
+    def __init__(self, name: str, message: Message):
+        self.name = name
+        self.message = message
+    #__init__
+
+#_RemoteMessage
+
+
+class RemoteActor:
+    """
+    Proxy for a component registered with an ActorServer.  Can be used
+    wherever a component with a comm() method is expected.  Obtain instances
+    with ActorClient.actor().
+    """
+    __slots__ = ("_client", "_name")
+
+    def __init__(self, client, name: str):
+        self._client = client
+        self._name = name
+    #__init__
+
+
+    def name(self) -> str:
+        """
+        :returns: the name of the remote component.
+        """
+        return self._name
+    #name
+
+
+    def comm(self, message: Message) -> None:
+        """
+        Queues up a message for the remote component and returns immediately.
+
+        :param message: A picklable instance of a class derived from Message.
+        """
+        self._client.comm(_RemoteMessage(self._name, message))
+    #comm
+
+#RemoteActor
+
+
+class ActorClient(ReactiveThread):
+    """
+    Asynchronous component that sends messages to the components registered
+    with an ActorServer, over one connection that all RemoteActor proxies of
+    the client share.
+
+    Messages that are queued up while a batch is being sent are sent together
+    in the next batch, with one write, so small messages cost little.  If the
+    connection fails, the client reconnects with exponential back-off and
+    resends the batch that failed.  Messages are never reordered, but a batch
+    written just before the server went away may be lost or delivered twice,
+    because the server does not acknowledge what it receives.
+
+    Messages that are still queued when the client is stopped are discarded;
+    send the client a QuitMessage to stop it after all queued messages have
+    been sent.
+    """
+
+    def __init__(self,
+                 name: str,
+                 address: str|tuple,
+                 batchSize: int = 256,
+                 mailbox: Mailbox|None = None,
+                 reconnectDelay: float = 0.05,
+                 maxReconnectDelay: float = 2.0):
+        """
+        Constructor.
+
+        :param name:              The client's name.
+
+        :param address:           The server's address; see ActorServer.
+
+        :param batchSize:         Maximum number of messages per write.
+
+        :param mailbox:           See ReactiveThread.  A bounded mailbox limits
+                                  the number of messages held while the server
+                                  is unreachable.
+
+        :param reconnectDelay:    Time in seconds before the first reconnection
+                                  attempt.  Doubles with each failed attempt.
+
+        :param maxReconnectDelay: Maximum time in seconds between reconnection
+                                  attempts.
+        """
+        super().__init__(name, batchSize = batchSize, mailbox = mailbox)
+        self._address = address
+        self._reconnectDelay = reconnectDelay
+        self._maxReconnectDelay = maxReconnectDelay
+        self._socket = None
+        self._stopEvent = threading.Event()
+        self._sent = 0
+        self._batches = 0
+        self._reconnects = 0
+    #__init__
+
+
+    def actor(self, name: str) -> RemoteActor:
+        """
+        :returns: a proxy for the component registered under 'name' with the
+                  server.
+        """
+        return RemoteActor(self, name)
+    #actor
+
+
+    def sentCount(self) -> int:
+        """
+        :returns: the number of messages sent.
+        """
+        return self._sent
+    #sentCount
+
+
+    def batchCount(self) -> int:
+        """
+        :returns: the number of writes (batches) sent.
+        """
+        return self._batches
+    #batchCount
+
+
+    def reconnectCount(self) -> int:
+        """
+        :returns: the number of times the connection was re-established.
+        """
+        return self._reconnects
+    #reconnectCount
+
+
+    def threadCodePre(self) -> None:
+        self._stopEvent.clear()
+    #threadCodePre
+
+
+    def threadCodePost(self) -> None:
+        self._disconnect()
+    #threadCodePost
+
+
+    @messageProcessor(_RemoteMessage, batch = True)
+    def _send(self, messages: list[_RemoteMessage]) -> None:
+        payload = pickle.dumps([ (m.name, m.message) for m in messages ],
+                               pickle.HIGHEST_PROTOCOL)
+        frame = _FRAME.pack(len(payload)) + payload
+        delay = self._reconnectDelay
+        while self._running:
+            try:
+                if self._socket is None:
+                    self._connect()
+                #if
+                self._socket.sendall(frame)
+                self._sent += len(messages)
+                self._batches += 1
+                return
+            except OSError as e:
+                _logger.warning("%s: cannot send to %s: %s",
+                                self._name, self._address, e)
+                self._disconnect()
+            #except
+            if self._stopEvent.wait(delay):
+                break
+            #if
+            delay = min(2 * delay, self._maxReconnectDelay)
+        #while
+    #_send
+
+
+    def _connect(self) -> None:
+        family = _socketFamily(self._address)
+        sock = socket.socket(family, socket.SOCK_STREAM)
+        try:
+            sock.connect(self._address)
+        except OSError:
+            sock.close()
+            raise
+        #except
+        if family == socket.AF_INET:
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        #if
+        if self._batches:
+            self._reconnects += 1
+        #if
+        self._socket = sock
+    #_connect
+
+
+    def _disconnect(self) -> None:
+        if self._socket is not None:
+            self._socket.close()
+            self._socket = None
+        #if
+    #_disconnect
+
+
+    def _wakeUp(self) -> None:
+        super()._wakeUp()
+        self._stopEvent.set()
+    #_wakeUp
+
+#ActorClient
+
+
+class _PipelineStage(ReactiveThreadPool):
+    """
+    A stage of a Pipeline: applies a function to each message and hands the
+    results on to the next stage, one batch at a time.
+    """
+
+    def __init__(self,
+                 name: str,
+                 function: Callable,
+                 workers: int,
+                 capacity: int|None,
+                 batchSize: int):
+        super().__init__(name, workers,
+                         batchSize = batchSize,
+                         mailbox = Mailbox(capacity))
+        self._function = function
+        self._next = None
+        self._statsLock = threading.Lock()
+        self._received = 0
+        self._emitted = 0
+        self._busy = 0.0
+        self._started = None
+        self._ended = None
+        self._finished = 0
+        self.addBatchMessageProcessor(Message, self._processBatch)
+    #__init__
+
+
+    def start(self) -> None:
+        with self._statsLock:
+            self._started = time.monotonic()
+            self._ended = None
+            self._finished = 0
+        #with
+        super().start()
+    #start
+
+
+    def stats(self) -> dict:
+        """
+        :returns: the stage's counters.
+        """
+        with self._statsLock:
+            if self._started is None:
+                elapsed = 0.0
+            else:
+                elapsed = (self._ended or time.monotonic()) - self._started
+            #else
+            return {
+                "stage": self._name,
+                "workers": self._workers,
+                "received": self._received,
+                "emitted": self._emitted,
+                "queued": self._messages.qsize(),
+                "busy": self._busy,
+                "throughput": self._received / elapsed if elapsed else 0.0,
+                "utilisation": self._busy / (elapsed * self._workers)
+                               if elapsed else 0.0,
+            }
+        #with
+    #stats
+
+
+    def _processBatch(self, messages: list) -> None:
+        start = time.perf_counter()
+        function = self._function
+        results = []
+        for message in messages:
+            result = function(message)
+            if result is None:
+                continue
+            elif isinstance(result, Message):
+                results.append(result)
+            else:
+                results.extend(result)
+            #else
+        #for
+        busy = time.perf_counter() - start
+        if results and self._next is not None:
+            if isinstance(self._next, _PipelineStage):
+                self._next._messages.putMany(results)
+            else:
+                for result in results:
+                    self._next.comm(result)
+                #for
+            #else
+        #if
+        with self._statsLock:
+            self._received += len(messages)
+            self._emitted += len(results)
+            self._busy += busy
+        #with
+    #_processBatch
+
+
+    def _workerCode(self) -> None:
+        try:
+            super()._workerCode()
+        finally:
+            with self._statsLock:
+                self._finished += 1
+                last = self._finished == self._workers
+                if last:
+                    self._ended = time.monotonic()
+                #if
+            #with
+            if last and self._quit and self._next is not None:
+                self._next.comm(QuitMessage())
+            #if
+        #finally
+    #_workerCode
+
+#_PipelineStage
+
+
+class Pipeline:
+    """
+    A chain of stages, each of which applies a function to the messages it
+    receives and hands the results on to the next stage.
+
+    Each stage runs on its own ReactiveThreadPool (one worker by default,
+    which preserves message order) with a mailbox of bounded capacity, so
+    that a slow stage blocks the stages before it instead of letting queues
+    grow.  Between stages, results are handed on one batch at a time, with
+    Mailbox.putMany(); the output receives them one by one with comm().
+
+    A QuitMessage sent with comm() drains the pipeline in order: each stage
+    processes all messages queued before the QuitMessage, quits, and then
+    passes the QuitMessage on to the next stage.
+
+    report() returns per-stage counters; the stage with the highest
+    utilisation is the bottleneck.
+
+    Example:
+
+        P = Pipeline("etl")
+        P.addStage("parse", parse).addStage("transform", transform, workers=4)
+        P.addStage("write", write)
+        P.start()
+        for line in lines:
+            P.comm(Line(line))
+        #for
+        P.comm(QuitMessage())
+        P.wait()
+    """
+
+    def __init__(self, name: str, output = None):
+        """
+        Constructor.
+
+        :param name:   The pipeline's name, used as a prefix for the stages'
+                       names.
+
+        :param output: Any object with a comm() method, e.g. a ReactiveThread,
+                       that receives the results of the last stage.  If None,
+                       they are discarded.
+        """
+        self._name = name
+        self._output = output
+        self._stages = []
+    #__init__
+
+
+    def addStage(self,
+                 name: str,
+                 function: Callable[[Message], Message|Iterable|None],
+                 workers: int = 1,
+                 capacity: int|None = 1024,
+                 batchSize: int = 64) -> "Pipeline":
+        """
+        Appends a stage.  Use this method only before start().
+
+        :param name:      The stage's name.
+
+        :param function:  A function that takes a message and returns a
+                          message, an iterable of messages, or None.
+                          Must be thread-safe if workers > 1.
+
+        :param workers:   Number of worker threads.  With more than one, the
+                          stage does not preserve message order.
+
+        :param capacity:  Capacity of the stage's mailbox.  If None, unbounded.
+
+        :param batchSize: Maximum number of messages a worker processes (and
+                          whose results it hands on) at once.
+
+        :returns: the pipeline itself, to chain calls.
+        """
+        stage = _PipelineStage("%s.%s" % (self._name, name), function,
+                               workers, capacity, batchSize)
+        if self._stages:
+            self._stages[-1]._next = stage
+        #if
+        stage._next = self._output
+        self._stages.append(stage)
+        return self
+    #addStage
+
+
+    def start(self) -> None:
+        """
+        Starts all stages, the last one first.
+        """
+        for stage in reversed(self._stages):
+            stage.start()
+        #for
+    #start
+
+
+    def comm(self, message: Message) -> None:
+        """
+        Sends a message to the first stage.  Blocks while its mailbox is full.
+
+        :param message: An instance of a class derived from Message.
+        """
+        self._stages[0].comm(message)
+    #comm
+
+
+    def stop(self) -> None:
+        """
+        Stops all stages as soon as possible, the first one first.  Queued
+        messages may remain unprocessed.
+        """
+        for stage in self._stages:
+            stage.stop()
+        #for
+    #stop
+
+
+    def wait(self) -> None:
+        """
+        Waits for all stages to quit, the first one first.
+        """
+        for stage in self._stages:
+            stage.wait()
+        #for
+    #wait
+
+
+    def report(self) -> list[dict]:
+        """
+        :returns: for each stage, in order: its name, number of workers,
+                  numbers of received and emitted messages, number of queued
+                  messages, busy time in seconds, throughput in messages per
+                  second while running, and utilisation (busy time over
+                  available worker time).
+        """
+        return [ stage.stats() for stage in self._stages ]
+    #report
+
+
+    def bottleneck(self) -> str|None:
+        """
+        :returns: the name of the stage with the highest utilisation, or None
+                  if there are no stages.
+        """
+        report = self.report()
+        if not report:
+            return None
+        #if
+        return max(report, key = lambda stats : stats["utilisation"])["stage"]
+    #bottleneck
+
+#Pipeline
+
+
+class SimulationExecutor:
+    """
+    Runs reactive components deterministically in a single thread and in
+    virtual time, for testing.
+
+    Components are added with add() instead of being started.  Messages
+    sent with their comm() are processed by step() or run(), one at a time:
+    if several components have queued messages, a seeded random number
+    generator picks one, so that each seed yields one reproducible
+    interleaving.  Message processing takes no virtual time.  When no
+    component has queued messages, the virtual clock jumps to the next timer
+    created with commAfter() or commEvery(), which have the same signatures
+    as those of Scheduler.  Hence, code that takes a scheduler argument can
+    be tested with a SimulationExecutor instead.
+
+    Processors must not block: they should not call time.sleep() (use timers
+    instead), and mailboxes must not use OverflowPolicy.BLOCK.
+    """
+
+    def __init__(self, seed: int = 0, start: float = 0.0):
+        """
+        Constructor.
+
+        :param seed:  Seed for choosing the next component.
+
+        :param start: Initial value of the virtual clock, in seconds.
+        """
+        self._random = random.Random(seed)
+        self._now = start
+        self._actors = []
+        self._timers = _TimerQueue()
+    #__init__
+
+
+    def now(self) -> float:
+        """
+        :returns: the virtual time in seconds.
+        """
+        return self._now
+    #now
+
+
+    def actors(self) -> list:
+        """
+        :returns: the components that have not quit yet.
+        """
+        return list(self._actors)
+    #actors
+
+
+    def add(self, actor: ReactiveThread) -> None:
+        """
+        Adds a component that has not been started, and runs its
+        threadCodePre().
+        """
+        actor._running = True
+        actor._messages.clearInterrupt()
+        actor.threadCodePre()
+        self._actors.append(actor)
+    #add
+
+
+    def commAfter(self, actor, message: Message, delay: float) -> TimerHandle:
+        """
+        See Scheduler.commAfter(), but in virtual time.
+        """
+        return self._add(actor, message, delay, None)
+    #commAfter
+
+
+    def commEvery(self,
+                  actor,
+                  message: Message,
+                  period: float,
+                  delay: float|None = None) -> TimerHandle:
+        """
+        See Scheduler.commEvery(), but in virtual time.
+        """
+        if period <= 0:
+            raise ValueError("'period' must be > 0")
+        #if
+        return self._add(actor, message,
+                         period if delay is None else delay, period)
+    #commEvery
+
+
+    def cancel(self, handle: TimerHandle) -> None:
+        """
+        See Scheduler.cancel().
+        """
+        if handle._scheduler is self:
+            self._timers.cancel(handle)
+        #if
+    #cancel
+
+
+    def step(self) -> bool:
+        """
+        Sends the messages of the timers that are due, or else processes one
+        queued message, or else advances the virtual clock to the next timer
+        and sends its messages.
+
+        :returns: False iff there was nothing to do.
+        """
+        if self._fireTimers(self._now):
+            return True
+        #if
+        ready = [ actor for actor in self._actors if actor._messages.qsize() ]
+        if ready:
+            actor = ready[0] if len(ready) == 1 else self._random.choice(ready)
+            messages = actor._messages.get(1, 0)
+            if messages and actor._processMessages(messages):
+                self._finish(actor)
+            #if
+            return True
+        #if
+        deadline = self._timers.nextDeadline()
+        while deadline is not None:
+            if self._fireTimers(deadline):
+                self._now = max(self._now, deadline)
+                return True
+            #if
+            deadline = self._timers.nextDeadline()
+        #while
+        return False
+    #step
+
+
+    def run(self,
+            until: float|None = None,
+            maxSteps: int|None = None) -> int:
+        """
+        Calls step() until there is nothing left to do, until the virtual
+        clock would pass 'until', or until 'maxSteps' steps have been made.
+
+        :param until:    Virtual time in seconds.  If given, the clock is set
+                         to it if there is nothing left to do before.
+
+        :param maxSteps: Maximum number of steps.
+
+        :returns: the number of steps made.
+        """
+        steps = 0
+        while maxSteps is None or steps < maxSteps:
+            if until is not None \
+                    and not any(a._messages.qsize() for a in self._actors):
+                deadline = self._timers.nextDeadline()
+                if deadline is None or deadline > until:
+                    self._now = max(self._now, until)
+                    break
+                #if
+            #if
+            if not self.step():
+                break
+            #if
+            steps += 1
+        #while
+        return steps
+    #run
+
+
+    def close(self) -> None:
+        """
+        Runs threadCodePost() of all components that have not quit yet and
+        removes them.
+        """
+        for actor in list(self._actors):
+            self._finish(actor)
+        #for
+    #close
+
+
+    def _fireTimers(self, now: float) -> bool:
+        due = self._timers.popDue(now)
+        for handle in due:
+            handle.actor.comm(handle.message)
+        #for
+        return bool(due)
+    #_fireTimers
+
+
+    def _finish(self, actor: ReactiveThread) -> None:
+        self._actors.remove(actor)
+        actor._running = False
+        actor.threadCodePost()
+    #_finish
+
+
+    def _add(self, actor, message: Message, delay: float,
+             period: float|None) -> TimerHandle:
+        handle = TimerHandle(self, actor, message, self._now + delay, period)
+        self._timers.push(handle)
+        return handle
+    #_add
+
+#SimulationExecutor
+
+
+class _ExecutorSlot:
+    """
+    Scheduling state of a component run by an ActorExecutor.
+    """
+    __slots__ = ("executor", "actor", "lock", "scheduled", "started",
+                 "finished", "done")
+
+    def __init__(self, executor, actor):
+        self.executor = executor
+        self.actor = actor
+        self.lock = threading.Lock()
+        self.scheduled = False
+        self.started = False
+        self.finished = False
+        self.done = threading.Event()
+    #__init__
+
+#_ExecutorSlot
+
+
+class ActorExecutor:
+    """
+    Runs many ReactiveThread instances on a fixed pool of worker threads,
+    instead of one thread per component.
+
+    A component is scheduled only when its mailbox is non-empty.  A worker
+    then processes up to 'quantum' of its messages and re-schedules it (at
+    the end of the ready queue) if more are queued, so that busy components
+    cannot starve others.  A component is never run by two workers at a
+    time, so its messages are still processed serially and in order.
+
+    Submitted components are stopped, and waited for, with their usual
+    stop() and wait().  Their processors must not block for long, since a
+    blocked processor occupies a worker.  ReactiveThreadPool and
+    ReactiveProcess instances cannot be submitted.
+    """
+
+    def __init__(self, name: str = "executor", workers: int = 4,
+                 quantum: int = 64):
+        """
+        Constructor.
+
+        :param name:    The executor's name.  Worker threads are named
+                        '<name>-<index>'.
+
+        :param workers: Number of worker threads.  Must be >= 1.
+
+        :param quantum: Maximum number of messages a component may process
+                        per turn.  Must be >= 1.
+        """
+        if workers < 1 or quantum < 1:
+            raise ValueError("'workers' and 'quantum' must be >= 1")
+        #if
+        self._name = name
+        self._workers = workers
+        self._quantum = quantum
+        self._ready = queue.SimpleQueue()
+        self._threads = []
+        self._slots = set()
+        self._lock = threading.Lock()
+    #__init__
+
+
+    def start(self) -> None:
+        """
+        Starts the worker threads.  Does nothing if they are running already.
+        """
+        with self._lock:
+            if self._threads:
+                return
+            #if
+            self._threads = [
+                threading.Thread(target = self._workerCode,
+                                 name = "%s-%d" % (self._name, i),
+                                 daemon = True)
+                for i in range(self._workers) ]
+            for thread in self._threads:
+                thread.start()
+            #for
+        #with
+    #start
+
+
+    def stop(self) -> None:
+        """
+        Stops all submitted components that are still running (see
+        ReactiveThread.stop()), then stops the worker threads.
+        """
+        with self._lock:
+            slots = list(self._slots)
+        #with
+        for slot in slots:
+            slot.actor.stop()
+        #for
+        with self._lock:
+            for _ in self._threads:
+                self._ready.put(None)
+            #for
+            for thread in self._threads:
+                thread.join()
+            #for
+            self._threads = []
+        #with
+    #stop
+
+
+    def submit(self, actor: ReactiveThread) -> None:
+        """
+        Starts running a component on the executor.  Its threadCodePre() is
+        run by a worker before its first message.
+
+        :param actor: A ReactiveThread that is not running.
+        """
+        if isinstance(actor, (ReactiveThreadPool, ReactiveProcess)):
+            raise TypeError("cannot submit %s to an ActorExecutor"
+                            % type(actor).__name__)
+        #if
+        if actor._running:
+            raise RuntimeError("component '%s' is already running"
+                               % actor.name())
+        #if
+        slot = _ExecutorSlot(self, actor)
+        with self._lock:
+            self._slots.add(slot)
+        #with
+        actor._executorSlot = slot
+        actor._running = True
+        actor._messages.clearInterrupt()
+        actor._messages.setListener(lambda : self._schedule(slot))
+        self._schedule(slot, force = True)
+    #submit
+
+
+    def _schedule(self, slot: _ExecutorSlot, force: bool = False) -> None:
+        """
+        Puts a component into the ready queue unless it is there already, is
+        being run, or has finished.
+        """
+        with slot.lock:
+            if slot.scheduled or slot.finished:
+                return
+            #if
+            if not force and not slot.actor._messages.qsize():
+                return
+            #if
+            slot.scheduled = True
+        #with
+        self._ready.put(slot)
+    #_schedule
+
+
+    def _stopActor(self, slot: _ExecutorSlot, wait: bool = True) -> None:
+        """
+        Stops a component, and waits for it to finish if 'wait' is True.
+        """
+        slot.actor._running = False
+        if not self._threads:
+            # no worker would ever pick the slot up
+            if not slot.finished:
+                self._finish(slot)
+            #if
+            return
+        #if
+        self._schedule(slot, force = True)
+        if wait:
+            slot.done.wait()
+        #if
+    #_stopActor
+
+
+    def _workerCode(self) -> None:
+        quantum = self._quantum
+        while True:
+            slot = self._ready.get()
+            if slot is None:
+                break
+            #if
+            if slot.finished:
+                continue
+            #if
+            actor = slot.actor
+            messages = actor._messages
+            finish = not actor._running
+            try:
+                if not slot.started and not finish:
+                    slot.started = True
+                    actor.threadCodePre()
+                #if
+                if not finish:
+                    batch = messages.get(quantum, 0)
+                    if batch and actor._metrics is not None:
+                        batch = actor._metrics._observe(batch,
+                                                        messages.qsize())
+                    #if
+                    finish = bool(batch) and actor._processMessages(batch)
+                #if
+            except Exception as e:
+                _logger.error("exception in component '%s': %s",
+                              actor.name(), e)
+                finish = True
+            #except
+            if finish or not actor._running:
+                self._finish(slot)
+                continue
+            #if
+            with slot.lock:
+                if messages.qsize():
+                    requeue = True
+                else:
+                    requeue = False
+                    slot.scheduled = False
+                #else
+            #with
+            if requeue:
+                self._ready.put(slot)
+            #if
+        #while
+    #_workerCode
+
+
+    def _finish(self, slot: _ExecutorSlot) -> None:
+        actor = slot.actor
+        with slot.lock:
+            slot.finished = True
+        #with
+        actor._messages.setListener(None)
+        try:
+            if slot.started:
+                actor.threadCodePost()
+            #if
+        finally:
+            actor._running = False
+            actor._executorSlot = None
+            with self._lock:
+                self._slots.discard(slot)
+            #with
+            slot.done.set()
+        #finally
+    #_finish
+
+#ActorExecutor
+
+
+class AsyncReactiveActor(_AskingDispatcher):
+    """
+    Like ReactiveThread, but the message processing loop runs as an asyncio
+    task instead of in its own thread, so that many mostly idle components
+    can share one event loop.
+
+    Derive from this class exactly as you would derive from ReactiveThread.
+    Message processors, threadCodePre() and threadCodePost() may be plain
+    functions or coroutine functions.
+
+    comm() may be called from any thread, so a ReactiveThread can send
+    messages to an AsyncReactiveActor directly.  In the other direction, use
+    ReactiveThread.commAsync() from within a coroutine.
+    """
+
+    def __init__(self, name: str, batchSize: int = 1):
+        """
+        Constructor.
+
+        :param name:      The actor's name.
+
+        :param batchSize: Maximum number of queued messages processed per
+                          wakeup before yielding to other tasks.
+                          Must be >= 1.
+        """
+        if batchSize < 1:
+            raise ValueError("'batchSize' must be >= 1")
+        #if
+        super().__init__()
+        self._name = name
+        self._batchSize = batchSize
+        self._running = False
+        self._loop = None
+        self._task = None
+        self._messages = collections.deque()
+        self._event = None
+        self._signalled = False
+    #__init__
+
+
+    def name(self) -> str:
+        """
+        :returns: the actor's name.
+        """
+        return self._name
+    #name
+
+
+    def running(self) -> bool:
+        """
+        :returns: the current value of the running flag.
+        """
+        return self._running
+    #running
+
+
+    def start(self) -> None:
+        """
+        Starts the message processing loop as a task of the running event
+        loop, sets the running flag to True, and returns immediately.
+        Must be called from the event loop's thread.
+
+        If the loop is already running, does nothing.
+        """
+        if self._running:
+            _logger.warning("actor '%s' already running", self._name)
+            return
+        #if
+        self._loop = asyncio.get_running_loop()
+        self._event = asyncio.Event()
+        self._signalled = False
+        self._running = True
+        self._task = self._loop.create_task(self._taskCode(),
+                                            name = self._name)
+    #start
+
+
+    async def stop(self) -> None:
+        """
+        Sets the running flag to False and waits for the message processing
+        loop to return.  Some queued messages may remain unprocessed.
+        """
+        if self._running and self._task is not None:
+            self._running = False
+            self._event.set()
+            await self.wait()
+        #if
+    #stop
+
+
+    async def wait(self) -> None:
+        """
+        Waits for the message processing loop to return, but does not request
+        a stop.
+        """
+        if self._task is not None:
+            await self._task
+            self._task = None
+        #if
+    #wait
+
+
+    def comm(self,
+             message: Message,
+             ttl: float|None = None,
+             deadline: float|None = None) -> None:
+        """
+        Queues up a message and returns immediately.  May be called from any
+        thread.
+
+        :param message:  An instance of a class derived from Message.
+
+        :param ttl:      See ReactiveThread.comm().
+
+        :param deadline: See ReactiveThread.comm().
+        """
+        if ttl is not None or deadline is not None:
+            message = _Envelope(message, None, _deadline(ttl, deadline))
+        #if
+        self._messages.append(message)
+        loop = self._loop
+        if loop is None:
+            return
+        #if
+        try:
+            inLoop = asyncio.get_running_loop() is loop
+        except RuntimeError:
+            inLoop = False
+        #except
+        if inLoop:
+            self._event.set()
+        elif not self._signalled:
+            self._signalled = True
+            try:
+                loop.call_soon_threadsafe(self._event.set)
+            except RuntimeError:
+                pass  # event loop is closed
+            #except
+        #elif
+    #comm
+
+
+    def threadCodePre(self) -> None:
+        """
+        Override this method (possibly with a coroutine function) to implement
+        code that needs to be executed once BEFORE the message processing loop.
+        """
+        pass
+    #threadCodePre
+
+
+    def threadCodePost(self) -> None:
+        """
+        Override this method (possibly with a coroutine function) to implement
+        code that needs to be executed once AFTER the message processing loop.
+        """
+        pass
+    #threadCodePost
+
+
+    async def _taskCode(self) -> None:
+        try:
+            _logger.info("starting actor '%s'", self._name)
+            await _awaitIfNeeded(self.threadCodePre())
+            messages = self._messages
+            while self._running:
+                if not messages:
+                    self._signalled = False
+                    self._event.clear()
+                    if not messages and self._running:
+                        await self._event.wait()
+                    #if
+                    continue
+                #if
+                batch = [ messages.popleft()
+                          for _ in range(min(self._batchSize, len(messages))) ]
+                if await self._processMessages(batch):
+                    break
+                #if
+                await asyncio.sleep(0)
+            #while
+            await _awaitIfNeeded(self.threadCodePost())
+            _logger.info("terminating actor '%s'", self._name)
+        except Exception as e:
+            _logger.error("exception in actor '%s': %s", self._name, e)
+            raise e
+        finally:
+            self._running = False
+        #finally
+    #_taskCode
+
+
+    async def _processMessages(self, messages: list) -> bool:
+        """
+        Like ReactiveThread._processMessages, but awaits coroutine processors.
+
+        :returns: True iff a QuitMessage was received.
+        """
+        for processor, argument, envelope in self._dispatchSteps(messages):
+            if envelope is None:
+                if processor is None:
+                    return True
+                #if
+                await _awaitIfNeeded(processor(argument))
+                continue
+            #if
+            start = None if envelope.trace is None else time.perf_counter()
+            try:
+                result = await _awaitIfNeeded(processor(argument))
+            except Exception as e:
+                self._settle(envelope, None, e, start)
+            else:
+                self._settle(envelope, result, None, start)
+            #else
+        #for
+        return False
+    #_processMessages
+
+
+    def _dispatchSteps(self, messages: list):
+        """
+        Dispatches messages in order, like ReactiveThread._processMessages,
+        but leaves the processor calls to _processMessages(), which awaits
+        them.  Yields (processor, argument, envelope) for every processor
+        call, where envelope is None unless the call is for an enveloped
+        message (see _callEnveloped()), and finally (None, None, None) if a
+        QuitMessage was received.  Messages that are not processed are put
+        back with _putBack().
+        """
+        cache = self._dispatchCache
+        logInfo = _logger.isEnabledFor(logging.INFO)
+        i = 0
+        n = len(messages)
+        while i < n:
+            if i and not self._running:
+                self._putBack(messages[i:])
+                return
+            #if
+            message = messages[i]
+            messageClass = type(message)
+            i += 1
+            if messageClass is _Envelope:
+                kind, processor = self._openEnvelope(message)
+                if processor is not None:
+                    inner = message.message
+                    yield processor, \
+                        inner if kind == _SINGLE else [inner], message
+                    continue
+                #if
+            else:
+                try:
+                    kind, processor = cache[messageClass]
+                except KeyError:
+                    kind, processor = cache[messageClass] \
+                        = self._resolve(messageClass)
+                #except
+                if logInfo:
+                    _logger.info("%s: received message of type %s",
+                                 self._name, messageClass.__name__)
+                #if
+                if kind == _SINGLE:
+                    yield processor, message, None
+                    continue
+                #if
+                if kind == _BATCH:
+                    j = i
+                    while j < n and type(messages[j]) is messageClass:
+                        j += 1
+                    #while
+                    yield processor, messages[i - 1:j], None
+                    i = j
+                    continue
+                #if
+                if kind == _UNKNOWN:
+                    self._unknownMessage(messageClass)
+                elif logInfo:
+                    _logger.info("%s: received QuitMessage", self._name)
+                #elif
+            #else
+            if kind == _QUIT:
+                if i < n:
+                    self._putBack(messages[i:])
+                #if
+                yield None, None, None
+                return
+            #if
+        #while
+    #_dispatchSteps
+
+
+    def _putBack(self, messages: list) -> None:
+        self._messages.extendleft(reversed(messages))
+    #_putBack
+
+#AsyncReactiveActor
+
+
+async def _awaitIfNeeded(result):
+    if result is not None and inspect.isawaitable(result):
+        return await result
+    #if
+    return result
+#_awaitIfNeeded
+
+
+class ParallelBackend(enum.Enum):
+    """
+    Where parallelMap() runs the function:
+
+    - THREAD:  in a pool of threads; suits functions that release the GIL,
+               e.g. I/O.
+    - PROCESS: in a pool of processes; suits CPU-bound functions.  The
+               function, items and results must be picklable.
+    """
+    THREAD = enum.auto()
+    PROCESS = enum.auto()
+#ParallelBackend
+
+
+def parallelMap(function: Callable,
+                items: Iterable,
+                workers: int|None = None,
+                backend: ParallelBackend = ParallelBackend.THREAD,
+                ordered: bool = True,
+                chunkSize: int|None = None,
+                maxInFlight: int|None = None,
+                chunkTime: float = 0.01) -> typing.Iterator:
+    """
+    Applies a function to items in parallel and yields the results as they
+    become available.
+
+    Items are taken from 'items' lazily and handed to the workers in chunks;
+    at most 'maxInFlight' chunks are queued or running at a time, so memory
+    stays bounded even for very long iterables.  Unless 'chunkSize' is given,
+    the chunk size adapts so that a chunk takes about 'chunkTime' seconds.
+
+    If the function raises an exception, no further chunks are started,
+    queued chunks are cancelled, and the exception is raised by the
+    generator.  With ParallelBackend.THREAD, running chunks also stop after
+    the current item.  The same happens if the generator is closed early.
+
+    :param function:    A function that takes one item.
+
+    :param items:       The items.
+
+    :param workers:     Number of threads or processes.  If None, the number
+                        of CPUs.
+
+    :param backend:     See ParallelBackend.
+
+    :param ordered:     If True, results are yielded in item order; if False,
+                        in the order chunks finish, which is faster when
+                        processing times vary.
+
+    :param chunkSize:   Fixed number of items per chunk, or None for adaptive
+                        chunk sizes.
+
+    :param maxInFlight: Maximum number of chunks queued, running, or (if
+                        'ordered') finished but not yet yielded.  If None,
+                        twice the number of workers.
+
+    :param chunkTime:   Target processing time per chunk in seconds, for
+                        adaptive chunk sizes.  Larger values reduce overhead
+                        (especially for processes), smaller ones improve load
+                        balancing.
+
+    :returns: a generator of results.
+    """
+    workers = workers or os.cpu_count() or 1
+    maxInFlight = maxInFlight or 2 * workers
+    if chunkSize is not None and chunkSize < 1:
+        raise ValueError("'chunkSize' must be >= 1")
+    #if
+    if backend is ParallelBackend.PROCESS:
+        executor = concurrent.futures.ProcessPoolExecutor(workers)
+        cancelled = None
+    else:
+        executor = concurrent.futures.ThreadPoolExecutor(workers)
+        cancelled = threading.Event()
+    #else
+    iterator = iter(items)
+    size = chunkSize or 1
+    inFlight = set()
+    order = collections.deque()
+    finished = dict()
+    exhausted = False
+    try:
+        while True:
+            # in ordered mode, finished chunks that wait for an earlier one
+            # count too, so that buffered results stay bounded
+            while not exhausted \
+                    and len(order if ordered else inFlight) < maxInFlight:
+                chunk = list(itertools.islice(iterator, size))
+                if not chunk:
+                    exhausted = True
+                    break
+                #if
+                future = executor.submit(_applyChunk, function, chunk,
+                                         cancelled)
+                inFlight.add(future)
+                if ordered:
+                    order.append(future)
+                #if
+            #while
+            if not inFlight:
+                break
+            #if
+            done, _ = concurrent.futures.wait(
+                inFlight, return_when = concurrent.futures.FIRST_COMPLETED)
+            for future in done:
+                inFlight.remove(future)
+                results, elapsed = future.result()
+                if chunkSize is None:
+                    size = _nextChunkSize(size, len(results), elapsed,
+                                          chunkTime)
+                #if
+                if ordered:
+                    finished[future] = results
+                else:
+                    yield from results
+                #else
+            #for
+            while order and order[0] in finished:
+                yield from finished.pop(order.popleft())
+            #while
+        #while
+    finally:
+        if cancelled is not None:
+            cancelled.set()
+        #if
+        executor.shutdown(wait = True, cancel_futures = True)
+    #finally
+#parallelMap
+
+
+def parallelForEach(function: Callable, items: Iterable, **kwargs) -> None:
+    """
+    Like parallelMap(), but discards the results.  Returns when all items
+    are processed, or raises the first exception the function raises.
+
+    :param kwargs: See parallelMap(), except that 'ordered' is ignored.
+    """
+    kwargs["ordered"] = False
+    for _ in parallelMap(function, items, **kwargs):
+        pass
+    #for
+#parallelForEach
+
+
+def _applyChunk(function: Callable,
+                chunk: list,
+                cancelled: threading.Event|None) -> tuple[list, float]:
+    """
+    Applies a function to a chunk of items in a worker.
+
+    :returns: the results and the processing time.
+    """
+    start = time.perf_counter()
+    results = []
+    for item in chunk:
+        if cancelled is not None and cancelled.is_set():
+            break
+        #if
+        results.append(function(item))
+    #for
+    return results, time.perf_counter() - start
+#_applyChunk
+
+
+def _nextChunkSize(size: int, count: int, elapsed: float,
+                   target: float) -> int:
+    """
+    :returns: the chunk size that makes a chunk take about 'target' seconds,
+              given that 'count' items took 'elapsed' seconds; at most twice
+              and at least half the current size.
+    """
+    if elapsed <= 0.0 or count == 0:
+        return 2 * size
+    #if
+    ideal = int(count * target / elapsed)
+    return max(1, size // 2, min(2 * size, ideal))
+#_nextChunkSize
 
 
 ### aczutro ###################################################################
@@ -0,0 +1,89 @@
+# Copyright (C) 2005 - present  Alexander Czutro <github@czutro.ch>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# For more details, see the provided licence file or
+# <http://www.gnu.org/licenses>.
+#
+################################################################### aczutro ###
+
+"""
+Tests of module 'lib.czthreading'.
+
+Run from the repository root after sourcing .setenv:
+
+    python -m unittest discover tests
+"""
+
+from czutils.lib import czthreading
+
+import threading
+import time
+import unittest
+
+
+class Item(czthreading.Message):
+    __slots__ = ("index",)
+
+    def __init__(self, index: int):
+        super().__init__()
+        self.index = index
+    #__init__
+#Item
+
+
+class Recorder(czthreading.ReactiveThreadPool):
+    """
+    A pool that records the indices of the items it processes.
+    """
+    def __init__(self, workers: int, batchSize: int):
+        super().__init__("recorder", workers, batchSize = batchSize)
+        self.processed = []
+        self._processedLock = threading.Lock()
+        self.addMessageProcessor(Item, self.processItem)
+    #__init__
+
+    def processItem(self, message: Item):
+        time.sleep(0.001)
+        with self._processedLock:
+            self.processed.append(message.index)
+        #with
+    #processItem
+#Recorder
+
+
+class TestReactiveThreadPool(unittest.TestCase):
+
+    def testQuitStopsLaterMessages(self):
+        """
+        No worker processes messages queued after a QuitMessage, also when
+        workers take several messages at a time.  All messages are queued
+        before the workers start, so that they compete for them.
+        """
+        for _ in range(20):
+            pool = Recorder(workers = 4, batchSize = 2)
+            for i in range(19): # the QuitMessage is second in its batch
+                pool.comm(Item(i))
+            #for
+            pool.comm(czthreading.QuitMessage())
+            for i in range(19, 39):
+                pool.comm(Item(i))
+            #for
+            pool.start()
+            pool.wait()
+            self.assertEqual(sorted(pool.processed), list(range(19)))
+            self.assertEqual(pool.mailbox().qsize(), 20)
+        #for
+    #testQuitStopsLaterMessages
+
+#TestReactiveThreadPool
+
+
+if __name__ == '__main__':
+    unittest.main()
+#if
+
+### aczutro ###################################################################